@@ -0,0 +1,98 @@
+"""Measures how late a 1ms asyncio ticker runs while the event loop prints and logs to a slow stdout.
+
+Run from the repository root: python -m benchmarks.bench_aprint
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from cli_ih.utils import safe_print, aprint, CLILoggingHandler, register_handler, register_loop_thread
+
+class SlowStdout:
+    """A stdout whose writes take 2ms, like a stalled SSH session."""
+    encoding = "utf-8"
+
+    def write(self, text):
+        time.sleep(0.002)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+class FakeHandler:
+    def __init__(self):
+        self.print_lock = threading.Lock()
+        self.cursor = "> "
+        self.input_buffer = ""
+        self.processing_command = False
+
+def hold_lock(handler: FakeHandler, stop: threading.Event):
+    # Another thread (e.g. the input thread echoing keys) holding print_lock now and then.
+    while not stop.is_set():
+        with handler.print_lock:
+            time.sleep(0.005)
+        time.sleep(0.005)
+
+async def ticker(lateness: list, duration: float):
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lateness.append(time.perf_counter() - start - 0.001)
+
+async def producer(logger: logging.Logger, duration: float, use_aprint: bool):
+    end = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < end:
+        logger.info("processed item %d", i)
+        if use_aprint:
+            await aprint("item", i)
+        else:
+            safe_print(f"item {i}")
+        i += 1
+        await asyncio.sleep(0.005)
+
+async def run(offload: bool, duration: float) -> list:
+    if offload:
+        register_loop_thread(threading.get_ident())
+    lateness: list[float] = []
+    logger = logging.getLogger(f"bench_aprint.{offload}")
+    logger.propagate = False
+    logger.addHandler(CLILoggingHandler(logging.INFO))
+    logger.setLevel(logging.INFO)
+    try:
+        await asyncio.gather(ticker(lateness, duration), producer(logger, duration, offload))
+    finally:
+        register_loop_thread(None)
+    return lateness
+
+def report(name: str, lateness: list):
+    lateness.sort()
+    p99 = lateness[int(len(lateness) * 0.99)]
+    print(f"{name:<28} ticks {len(lateness):6d}   p99 late {p99 * 1000:7.2f}ms   max late {lateness[-1] * 1000:7.2f}ms")
+
+def main(duration: float = 2.0):
+    handler = FakeHandler()
+    register_handler(handler)
+    stop = threading.Event()
+    threading.Thread(target=hold_lock, args=(handler, stop), daemon=True).start()
+
+    real_stdout = sys.stdout
+    sys.stdout = SlowStdout()
+    try:
+        blocking = asyncio.run(run(False, duration))
+        # Unregistering the loop thread waits for the printer thread to catch up.
+        offloaded = asyncio.run(run(True, duration))
+    finally:
+        sys.stdout = real_stdout
+        stop.set()
+
+    report("safe_print on the loop", blocking)
+    report("aprint / printer thread", offloaded)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Measures how many key events per second the LineEditor state machine processes.
+
+Run from the repository root: python -m benchmarks.bench_line_editor
+"""
+import time
+from cli_ih.line_editor import LineEditor
+
+def bench(name: str, editor_feed, chunks: list, events_per_round: int, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for chunk in chunks:
+            editor_feed(chunk)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {events_per_round * rounds / elapsed / 1e6:8.2f} M events/s")
+
+def main():
+    line = b"db export users --format csv --since 2024-01-01\r"
+    editor = LineEditor("> ")
+    bench("bytes, whole lines", editor.feed, [line], len(line), 200_000)
+
+    editor = LineEditor("> ")
+    keys = [bytes([b]) for b in line]
+    bench("bytes, one key per call", editor.feed, keys, len(keys), 20_000)
+
+    editor = LineEditor("> ")
+    for i in range(100):
+        editor.add_history(f"command {i}")
+    nav = [b"\x1b[A"] * 50 + [b"\x1b[B"] * 50
+    bench("bytes, history navigation", editor.feed, nav, len(nav), 10_000)
+
+    editor = LineEditor("> ")
+    text = line.decode()
+    bench("keys, whole lines", editor.feed_keys, [text], len(text), 200_000)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from .client import InputHandler
 from .asyncClient import AsyncInputHandler
-from .utils import safe_print, CLILoggingHandler
+from .utils import safe_print, aprint, drain_output, CLILoggingHandler, LogThrottle, set_log_throttle, set_output_mode, set_stdout_writer
+from .output import StdoutWriter
 import importlib.metadata
 
 try:
@@ -1,13 +1,20 @@
 from typing import Callable, Any
 from .exceptions import HandlerClosed
-from .utils import safe_print as print, register_handler, SafeLogger, wrap_logger_handlers, install_global_patch
-import logging, warnings, asyncio, inspect, threading, sys, shutil
+from .utils import safe_print as print, emit_result, get_recorder, write_text, write_bytes, terminal_output, call_output, drain_output, register_loop_thread, register_handler, running_command, SafeLogger, wrap_logger_handlers, install_global_patch
+import logging, warnings, asyncio, inspect, threading, sys, shutil, re, time, cProfile, functools
 from . import platform_input as input_lib
+from .scrollback import ScrollbackBuffer
+from .lazy import LazyCommand, warm_commands
+from .command_tree import CommandTree, CommandGroup
+from .line_editor import LineEditor, OUTPUT, SUBMIT, INTERRUPT
+from .profiling import active_profiler, active_memory_profile, parse_options, format_profile, MemoryProfile, PROFILE_USAGE, MEMPROFILE_USAGE
+from .scheduler import AsyncScheduler, ScheduledJob, parse_duration
 
 class AsyncInputHandler:
-    def __init__(self, cursor = "", thread_mode: bool = True, *, logger: logging.Logger | None = None, register_defaults: bool = True):
+    def __init__(self, cursor = "", thread_mode: bool = True, *, logger: logging.Logger | None = None, register_defaults: bool = True, scrollback_size: int = 1 << 20):
         register_handler(self)
         self.commands = {}
+        self.command_tree = CommandTree()
         self.is_running = False
         self.thread_mode = thread_mode
         self.cursor = f"{cursor.strip()} " if cursor else ""
@@ -30,17 +37,46 @@ class AsyncInputHandler:
 
         self.register_defaults = register_defaults
         self.print_lock = threading.Lock()
-        self.input_buffer = ""
+        self.editor = LineEditor(self.cursor, columns=lambda: shutil.get_terminal_size().columns, encoding=getattr(sys.stdout, "encoding", None) or "utf-8")
         self.processing_command = False
-        self.history = []
-        self.history_index = 0
         self.using_raw_mode_active = True
+        self.scrollback = ScrollbackBuffer(scrollback_size) if scrollback_size else None
+        self.scheduler = AsyncScheduler(self._run_scheduled)
         
         if self.register_defaults:
             self.register_default_commands()
         else:
             self.__warning("The default commands are disabled in the current instance.")
 
+    @property
+    def current_command(self) -> str | None:
+        """The command run by the current thread or task, if any."""
+        return running_command.get()
+
+    @property
+    def input_buffer(self) -> str:
+        return self.editor.buffer
+
+    @input_buffer.setter
+    def input_buffer(self, value: str):
+        self.editor.buffer = value
+
+    @property
+    def history(self) -> list[str]:
+        return self.editor.history
+
+    @history.setter
+    def history(self, value: list[str]):
+        self.editor.history = value
+
+    @property
+    def history_index(self) -> int:
+        return self.editor.history_index
+
+    @history_index.setter
+    def history_index(self, value: int):
+        self.editor.history_index = value
+
     def get_logger(self):
         return self.logger
     
@@ -60,14 +96,17 @@ class AsyncInputHandler:
         self.logger.exception(f"{msg}: {e}")
 
     def __register_cmd(self, name: str, func: Callable[..., Any], description: str = "", legacy=False):
-        name = name.lower()
+        path = tuple(name.lower().split())
+        if not path:
+            raise SyntaxError("Command name must not be empty")
+        name = " ".join(path)
         if not description:
             description = "A command"
-        if ' ' in name:
-            raise SyntaxError("Command name must not have spaces")
         if name in self.commands:
             raise SyntaxError(f"Command '{name}' is already registered. If theese commands have a different case and they need to stay the same, downgrade the package version to 0.5.x")
-        self.commands[name] = {"cmd": func, "description": description, "legacy": legacy}
+        data = {"cmd": func, "description": description, "legacy": legacy}
+        self.commands[name] = data
+        self.command_tree.insert(path).command = data
 
     def register_command(self, name: str, func: Callable[..., Any], description: str = ""):
         """(DEPRECATED) Registers a command with its associated function. This will be deleted in v0.8.0"""
@@ -82,9 +121,73 @@ class AsyncInputHandler:
             return func
         return decorator
 
+    def group(self, name: str, description: str = "") -> CommandGroup:
+        """Returns a command group. Commands registered through it are run as "<group> <command> [args]"."""
+        path = tuple(name.lower().split())
+        if not path:
+            raise SyntaxError("Group name must not be empty")
+        node = self.command_tree.insert(path)
+        if description:
+            node.description = description
+        return CommandGroup(self, " ".join(path))
+
+    def lazy_command(self, name: str, target: str, *, description: str = "", warm: bool = False):
+        """Registers a command by its "package.module:function" path. The module is only imported when the command is first run, or in the background on start() if warm is True."""
+        self.__register_cmd(name, LazyCommand(target, warm=warm), description)
+
+    def warm_lazy_commands(self, only_marked: bool = False) -> threading.Thread | None:
+        """Imports the lazy commands in a background thread."""
+        lazy = [data["cmd"] for data in self.commands.values() if isinstance(data["cmd"], LazyCommand)]
+        return warm_commands([cmd for cmd in lazy if cmd.warm or not only_marked])
+
+    def every(self, interval: str | float, command: str) -> ScheduledJob:
+        """Runs a command line repeatedly at a fixed rate, e.g. handler.every("5s", "stats")."""
+        seconds = parse_duration(interval)
+        return self.scheduler.schedule(command, seconds, seconds)
+
+    def after(self, delay: str | float, command: str) -> ScheduledJob:
+        """Runs a command line once after a delay, e.g. handler.after("10m", "backup")."""
+        return self.scheduler.schedule(command, parse_duration(delay))
+
+    def cancel_job(self, job_id: int) -> bool:
+        """Cancels a scheduled job. Returns False if no such job exists."""
+        return self.scheduler.cancel(job_id)
+
+    async def _run_scheduled(self, job: ScheduledJob):
+        try:
+            await self._execute(job.command, scheduled=True)
+        except HandlerClosed:
+            self.__info("Input Handler exited.")
+            self.is_running = False
+
+    def __schedule_cmd(self, when: str, command: tuple, repeat: bool):
+        if not command:
+            return self.__warning(f"Usage: {'every' if repeat else 'after'} <{'interval' if repeat else 'delay'}> <command> [args]")
+        node, _, _ = self.command_tree.resolve(list(command))
+        if node is None:
+            return self.__warning(f"Unknown command: '{command[0].lower()}'")
+        try:
+            job = self.every(when, " ".join(command)) if repeat else self.after(when, " ".join(command))
+        except ValueError as e:
+            return self.__warning(str(e))
+        print(f"Scheduled job {job.describe()}")
+
+    def __report_profile(self, profiler: cProfile.Profile, line: str, top: int, sort: str, output: str | None):
+        try:
+            print(format_profile(profiler, line, top, sort))
+        except TypeError:
+            return self.__warning(f"Nothing was profiled for '{line}'.")
+        if output:
+            try:
+                profiler.dump_stats(output)
+            except OSError as e:
+                return self.__warning(f"Could not write profile data: {e}")
+            print(f"Profile data written to '{output}'.")
+
     def start(self):
         """Starts the input handler loop. Runs in a thread if thread_mode is True, otherwise blocks."""
         self.is_running = True
+        self.warm_lazy_commands(only_marked=True)
         if self.thread_mode:
             thread = threading.Thread(target=self._start_thread, daemon=True)
             thread.start()
@@ -94,6 +197,11 @@ class AsyncInputHandler:
     def _start_thread(self):
         asyncio.run(self._run())
 
+    def _write_cursor(self):
+        with self.print_lock:
+            if sys.stdout.isatty() and terminal_output():
+                write_text(self.cursor)
+
     async def _run(self):
         """Starts the input handler loop in a separate thread if thread mode is enabled."""
         loop = asyncio.get_running_loop()
@@ -101,9 +209,8 @@ class AsyncInputHandler:
 
         def _input_worker():
             with self.print_lock:
-                if sys.stdout.isatty():
-                    sys.stdout.write(self.cursor)
-                    sys.stdout.flush()
+                if sys.stdout.isatty() and terminal_output():
+                    write_text(self.cursor)
 
             with input_lib.InputContext() as ctx:
                 using_raw_mode = getattr(ctx, 'using_raw_mode', True)
@@ -117,9 +224,7 @@ class AsyncInputHandler:
                                 if line:
                                     text = line.rstrip('\n\r')
                                     
-                                    if text and (not self.history or self.history[-1] != text):
-                                        self.history.append(text)
-                                    self.history_index = len(self.history)
+                                    self.editor.add_history(text)
                                     
                                     loop.call_soon_threadsafe(input_queue.put_nowait, text)
                             except Exception:
@@ -128,181 +233,166 @@ class AsyncInputHandler:
                             import time
                             time.sleep(0.05)
                 else:
+                    self.editor.cursor = self.cursor
                     while self.is_running:
                         try:
                             if input_lib.kbhit():
-                                char = input_lib.getwch()
-                                
-                                if char == '\xe0' or char == '\x00':
-                                    try:
-                                        scancode = input_lib.getwch()
-    
-                                        if scancode == 'H':
-                                            if self.history_index > 0:
-                                                self.history_index -= 1
-                                                self.input_buffer = self.history[self.history_index]
-                                                with self.print_lock:
-                                                    sys.stdout.write('\r' + ' ' * (shutil.get_terminal_size().columns - 1) + '\r')
-                                                    sys.stdout.write(self.cursor + self.input_buffer)
-                                                    sys.stdout.flush()
-                                            
-                                        elif scancode == 'P':
-                                            if self.history_index < len(self.history):
-                                                self.history_index += 1
-                                                
-                                            if self.history_index == len(self.history):
-                                                self.input_buffer = ""
-                                            else:
-                                                self.input_buffer = self.history[self.history_index]
-                                                
-                                            with self.print_lock:
-                                                sys.stdout.write('\r' + ' ' * (shutil.get_terminal_size().columns - 1) + '\r')
-                                                sys.stdout.write(self.cursor + self.input_buffer)
-                                                sys.stdout.flush()
-                                    except Exception:
-                                        pass
-
-                                elif char == '\r':
-                                    if using_raw_mode:
+                                for action, value in self.editor.feed_keys(input_lib.getwch()):
+                                    if action == OUTPUT:
+                                        if not terminal_output():
+                                            continue
                                         with self.print_lock:
-                                            sys.stdout.write('\n')
-                                            sys.stdout.flush()
-    
-                                    text = self.input_buffer
-                                    self.input_buffer = ""
-                                    
-                                    if text:
-                                        if not self.history or self.history[-1] != text:
-                                            self.history.append(text)
-                                        self.history_index = len(self.history)
-                                    
-                                    loop.call_soon_threadsafe(input_queue.put_nowait, text)
-                                        
-                                elif char == '\x08':
-                                    if len(self.input_buffer) > 0:
-                                        self.input_buffer = self.input_buffer[:-1]
-                                        if using_raw_mode:
-                                            with self.print_lock:
-                                                sys.stdout.write('\b \b')
-                                                sys.stdout.flush()
-                                    
-                                elif char == '\x03':
-                                    loop.call_soon_threadsafe(input_queue.put_nowait, KeyboardInterrupt)
-                                    break
-                                
-                                else:
-                                    if char.isprintable():
-                                        self.input_buffer += char
-                                        if using_raw_mode:
-                                            with self.print_lock:
-                                                sys.stdout.write(char)
-                                                sys.stdout.flush()
-    
+                                            write_bytes(value)
+                                    elif action == SUBMIT:
+                                        loop.call_soon_threadsafe(input_queue.put_nowait, value)
+                                    elif action == INTERRUPT:
+                                        loop.call_soon_threadsafe(input_queue.put_nowait, KeyboardInterrupt)
+                                        return
+
                             else:
                                 import time
                                 time.sleep(0.01)
-    
+
                         except Exception:
                             break
         
         thread = threading.Thread(target=_input_worker, daemon=True)
-        thread.start()
-
-        async def _run_command(commands: dict[str, dict[str, Any]], name: str, args: list[str]):
-            """Executes a command from the command dictionary if it exists."""
-            command = commands.get(name)
-            if not command:
-                self.__warning(f"Command '{name}' not found.")
-                return
+        register_loop_thread(threading.get_ident())
+        scheduler_task = loop.create_task(self.scheduler.run())
+        try:
+            thread.start()
+            while self.is_running:
+                try:
+                    try:
+                        user_input = await asyncio.wait_for(input_queue.get(), timeout=0.1)
+                    except asyncio.TimeoutError:
+                        continue
 
-            func = command.get("cmd")
-            is_legacy = command.get("legacy", False)
+                    if user_input is EOFError:
+                        self.__error("Input ended unexpectedly.")
+                        break
 
-            if not callable(func):
-                raise ValueError(f"The command '{name}' is not callable.")
+                    if user_input is KeyboardInterrupt:
+                        self.__error("Input interrupted.")
+                        break
+                
+                    if not user_input:
+                        continue
 
-            try:
-                sig = inspect.signature(func)
-                has_var_args = any(p.kind == inspect.Parameter.VAR_POSITIONAL for p in sig.parameters.values())
-                if has_var_args:
-                    final_args = args
-                else:
-                    params = [p for p in sig.parameters.values() if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.POSITIONAL_ONLY)]
-                    final_args = args[:len(params)]
-                if is_legacy:
-                    sig.bind(final_args)
-                else:
-                    sig.bind(*final_args)
-            except TypeError as e:
-                cmd_type = "legacy " if is_legacy else ""
-                self.__warning(f"Argument error for {cmd_type}command '{name}': {e}")
-                return
+                    self.processing_command = True
+                    await self._execute(user_input)
+                    self.processing_command = False
+                    call_output(self._write_cursor)
 
+                except EOFError:
+                    self.__error("Input ended unexpectedly.")
+                    break
+                except KeyboardInterrupt:
+                    self.__error("Input interrupted.")
+                    break
+                except HandlerClosed:
+                    self.__info("Input Handler exited.")
+                    break
+        finally:
+            self.is_running = False
+            scheduler_task.cancel()
+            register_loop_thread(None)
+
+    async def _run_command(self, name: str, args: list[str]):
+        """Executes a command from the command dictionary if it exists."""
+        command = self.commands.get(name)
+        if not command:
+            self.__warning(f"Command '{name}' not found.")
+            return
+
+        func = command.get("cmd")
+        is_legacy = command.get("legacy", False)
+
+        if isinstance(func, LazyCommand):
             try:
-                if is_legacy:
-                    warnings.warn("This way of running commands id Deprecated. And should be changed to the new decorator way.", DeprecationWarning, 2)
-                    if inspect.iscoroutinefunction(func):
-                        await func(final_args)
-                    else:
-                        await asyncio.to_thread(func, final_args)
-                else:
-                    if inspect.iscoroutinefunction(func):
-                        await func(*final_args)
-                    else:
-                        await asyncio.to_thread(func, *final_args)
-
-            except HandlerClosed as e:
-                raise e
+                func = func.resolve() if func.loaded else await asyncio.to_thread(func.resolve)
             except Exception as e:
-                self.__exeption(f"An error occurred in command '{name}'", e)
+                self.__exeption(f"Failed to load command '{name}'", e)
+                return
 
-        while self.is_running:
-            try:
-                try:
-                    user_input = await asyncio.wait_for(input_queue.get(), timeout=0.1)
-                except asyncio.TimeoutError:
-                    continue
+        if not callable(func):
+            raise ValueError(f"The command '{name}' is not callable.")
 
-                if user_input is EOFError:
-                    self.__error("Input ended unexpectedly.")
-                    break
-                
-                if not user_input:
-                    continue
-
-                self.processing_command = True
-                cmdargs = user_input.split(' ')
-                command_name = cmdargs[0].lower()
-                args = cmdargs[1:]
-                if command_name in self.commands:
-                    await _run_command(self.commands, command_name, args)
+        try:
+            sig = inspect.signature(func)
+            has_var_args = any(p.kind == inspect.Parameter.VAR_POSITIONAL for p in sig.parameters.values())
+            if has_var_args:
+                final_args = args
+            else:
+                params = [p for p in sig.parameters.values() if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.POSITIONAL_ONLY)]
+                final_args = args[:len(params)]
+            if is_legacy:
+                sig.bind(final_args)
+            else:
+                sig.bind(*final_args)
+        except TypeError as e:
+            cmd_type = "legacy " if is_legacy else ""
+            self.__warning(f"Argument error for {cmd_type}command '{name}': {e}")
+            return
+
+        try:
+            if is_legacy:
+                warnings.warn("This way of running commands id Deprecated. And should be changed to the new decorator way.", DeprecationWarning, 2)
+            call_args = (final_args,) if is_legacy else tuple(final_args)
+            profiler = active_profiler.get()
+
+            if inspect.iscoroutinefunction(func):
+                if profiler is None:
+                    result = await func(*call_args)
                 else:
-                    self.__warning(f"Unknown command: '{command_name}'")
-                self.processing_command = False
-                
-                with self.print_lock:
-                    if sys.stdout.isatty():
-                        sys.stdout.write(self.cursor)
-                        sys.stdout.flush()
-
-            except EOFError:
-                self.__error("Input ended unexpectedly.")
-                break
-            except KeyboardInterrupt:
-                self.__error("Input interrupted.")
-                break
-            except HandlerClosed:
-                self.__info("Input Handler exited.")
-                break
-        self.is_running = False
+                    profiler.enable()
+                    try:
+                        result = await func(*call_args)
+                    finally:
+                        profiler.disable()
+            else:
+                call = func if profiler is None else functools.partial(profiler.runcall, func)
+                memory_profile = active_memory_profile.get()
+                if memory_profile is not None:
+                    call = functools.partial(memory_profile.runcall, call)
+                result = await asyncio.to_thread(call, *call_args)
+            emit_result(name, result)
+
+        except HandlerClosed as e:
+            raise e
+        except Exception as e:
+            self.__exeption(f"An error occurred in command '{name}'", e)
+
+    async def _execute(self, text: str, scheduled: bool = False):
+        """Resolves a command line against the command tree and runs the matching command. scheduled marks runs started by the scheduler."""
+        recorder = get_recorder()
+        started = time.perf_counter()
+        try:
+            cmdargs = text.split(' ')
+            node, consumed, reached = self.command_tree.resolve(cmdargs)
+            if node is not None:
+                token = running_command.set(node.name)
+                try:
+                    await self._run_command(node.name, cmdargs[consumed:])
+                finally:
+                    running_command.reset(token)
+            elif reached is not self.command_tree.root:
+                print("\n".join([f"Commands in '{' '.join(cmdargs[:len(reached.path)]).lower()}':"] + self.command_tree.help_lines(reached)))
+            else:
+                self.__warning(f"Unknown command: '{cmdargs[0].lower()}'")
+        finally:
+            if recorder is not None:
+                recorder.record_command(text, started, time.perf_counter() - started, scheduled)
 
     def register_default_commands(self):
         @self.command(name="help", description="Displays all the available commands")
-        async def help(*args):
-            str_out = "Available commands:\n"
-            for command, data in self.commands.items():
-                str_out += f"  {command}: {data['description']}\n"
-            print(str_out)
+        async def help(*path):
+            if not path:
+                return print("\n".join(["Available commands:"] + self.command_tree.help_lines(self.command_tree.root)) + "\n")
+            _, _, group = self.command_tree.resolve(list(path))
+            if group is self.command_tree.root:
+                return self.__warning(f"Unknown command group: '{' '.join(path)}'")
+            print("\n".join([f"Commands in '{' '.join(path[:len(group.path)]).lower()}':"] + self.command_tree.help_lines(group)))
 
         @self.command(name="debug", description="If a logger is present changes the logging level to DEBUG.")
         async def debug_mode(*args):
@@ -324,6 +414,100 @@ class AsyncInputHandler:
                     handler.setLevel(new_level)
             self.__info(message)
 
+        @self.command(name="scrollback", description="Pages through recent output. Page 1 is the newest: scrollback [page]")
+        async def scrollback(page: str = "1"):
+            if self.scrollback is None:
+                return self.__warning("Scrollback is disabled for this InputHandler instance.")
+            try:
+                page_num = max(1, int(page))
+            except ValueError:
+                return self.__warning(f"Invalid page number: '{page}'")
+
+            # Output of earlier commands may still be queued for the printer thread.
+            await drain_output()
+            page_size = max(1, shutil.get_terminal_size().lines - 2)
+            total = len(self.scrollback)
+            pages = max(1, -(-total // page_size))
+            page_num = min(page_num, pages)
+            stop = total - (page_num - 1) * page_size
+            lines = self.scrollback.lines(max(0, stop - page_size), stop)
+            with self.scrollback.paused():
+                print("\n".join(lines + [f"-- page {page_num}/{pages} ({total} lines) --"]))
+
+        @self.command(name="grep", description="Searches recent output with a regular expression: grep <pattern>")
+        async def grep(*pattern):
+            if self.scrollback is None:
+                return self.__warning("Scrollback is disabled for this InputHandler instance.")
+            if not pattern:
+                return self.__warning("Usage: grep <pattern>")
+            await drain_output()
+            try:
+                matches = self.scrollback.search(" ".join(pattern))
+            except re.error as e:
+                return self.__warning(f"Invalid pattern: {e}")
+
+            with self.scrollback.paused():
+                print("\n".join([f"{num}: {line}" for num, line in matches] + [f"-- {len(matches)} match(es) --"]))
+
+        @self.command(name="every", description="Runs a command repeatedly: every <interval> <command> [args]")
+        async def every(interval: str, *command):
+            self.__schedule_cmd(interval, command, repeat=True)
+
+        @self.command(name="after", description="Runs a command once after a delay: after <delay> <command> [args]")
+        async def after(delay: str, *command):
+            self.__schedule_cmd(delay, command, repeat=False)
+
+        @self.command(name="jobs", description="Lists the scheduled jobs with their drift statistics")
+        async def jobs(*args):
+            jobs = self.scheduler.jobs()
+            if not jobs:
+                return print("No scheduled jobs.")
+            print("\n".join(["Scheduled jobs:"] + [f"  {job.describe()}" for job in jobs]))
+
+        @self.command(name="cancel", description="Cancels a scheduled job: cancel <id|all>")
+        async def cancel(job_id: str):
+            if job_id.lower() == "all":
+                return print(f"Cancelled {self.scheduler.cancel_all()} job(s).")
+            try:
+                cancelled = self.cancel_job(int(job_id.lstrip("#")))
+            except ValueError:
+                return self.__warning(f"Invalid job id: '{job_id}'")
+            if not cancelled:
+                return self.__warning(f"No scheduled job #{job_id.lstrip('#')}")
+            print(f"Cancelled job #{job_id.lstrip('#')}.")
+
+        @self.command(name="profile", description="Runs a command under cProfile and shows the hotspots: profile [-n top] [-s sort] [-o file.pstats] <command> [args]")
+        async def profile(*args):
+            try:
+                top, sort, output, line = parse_options(args, PROFILE_USAGE)
+            except ValueError as e:
+                return self.__warning(str(e))
+
+            profiler = cProfile.Profile()
+            token = active_profiler.set(profiler)
+            try:
+                await self._execute(line)
+            finally:
+                active_profiler.reset(token)
+            self.__report_profile(profiler, line, top, sort, output)
+
+        @self.command(name="memprofile", description="Runs a command under tracemalloc and shows the top allocations: memprofile [-n top] [-o file.snapshot] <command> [args]")
+        async def memprofile(*args):
+            try:
+                top, _, output, line = parse_options(args, MEMPROFILE_USAGE, sort=False)
+            except ValueError as e:
+                return self.__warning(str(e))
+
+            with MemoryProfile() as mem:
+                await self._execute(line)
+            print(mem.format(line, top))
+            if output:
+                try:
+                    mem.at_peak.dump(output)
+                except OSError as e:
+                    return self.__warning(f"Could not write snapshot: {e}")
+                print(f"Snapshot written to '{output}'.")
+
         @self.command(name="exit", description="Exits the Input Handler irreversibly.")
         async def exit_thread(*args):
             raise HandlerClosed("Handler was closed with exit command.")
\ No newline at end of file
@@ -1,13 +1,20 @@
 from typing import Callable, Any
 from .exceptions import HandlerClosed
-from .utils import safe_print as print, register_handler, SafeLogger, wrap_logger_handlers, install_global_patch
-import logging, sys, threading, warnings, inspect, shutil
+from .utils import safe_print as print, emit_result, get_recorder, write_text, write_bytes, terminal_output, register_handler, running_command, SafeLogger, wrap_logger_handlers, install_global_patch
+import logging, sys, threading, warnings, inspect, shutil, re, time, cProfile
 from . import platform_input as input_lib
+from .scrollback import ScrollbackBuffer
+from .lazy import LazyCommand, warm_commands
+from .command_tree import CommandTree, CommandGroup
+from .line_editor import LineEditor, OUTPUT, SUBMIT, INTERRUPT
+from .profiling import active_profiler, parse_options, format_profile, MemoryProfile, PROFILE_USAGE, MEMPROFILE_USAGE
+from .scheduler import ThreadScheduler, ScheduledJob, parse_duration
 
 class InputHandler:
-    def __init__(self, thread_mode = True, cursor = "", *, logger: logging.Logger | None = None, register_defaults: bool = True):
+    def __init__(self, thread_mode = True, cursor = "", *, logger: logging.Logger | None = None, register_defaults: bool = True, scrollback_size: int = 1 << 20):
         register_handler(self)
         self.commands = {}
+        self.command_tree = CommandTree()
         self.is_running = False
         self.thread_mode = thread_mode
         self.cursor = f"{cursor.strip()} " if cursor else ""
@@ -31,17 +38,46 @@ class InputHandler:
 
         self.register_defaults = register_defaults
         self.print_lock = threading.Lock()
-        self.input_buffer = ""
+        self.editor = LineEditor(self.cursor, columns=lambda: shutil.get_terminal_size().columns, encoding=getattr(sys.stdout, "encoding", None) or "utf-8")
         self.processing_command = False
-        self.history = []
-        self.history_index = 0
         self.using_raw_mode_active = True
+        self.scrollback = ScrollbackBuffer(scrollback_size) if scrollback_size else None
+        self.scheduler = ThreadScheduler(self._run_scheduled)
 
         if self.register_defaults:
             self.register_default_commands()
         else:
             self.__warning("The default commands are disabled in the current instance.")
 
+    @property
+    def current_command(self) -> str | None:
+        """The command run by the current thread or task, if any."""
+        return running_command.get()
+
+    @property
+    def input_buffer(self) -> str:
+        return self.editor.buffer
+
+    @input_buffer.setter
+    def input_buffer(self, value: str):
+        self.editor.buffer = value
+
+    @property
+    def history(self) -> list[str]:
+        return self.editor.history
+
+    @history.setter
+    def history(self, value: list[str]):
+        self.editor.history = value
+
+    @property
+    def history_index(self) -> int:
+        return self.editor.history_index
+
+    @history_index.setter
+    def history_index(self, value: int):
+        self.editor.history_index = value
+
     def get_logger(self):
         return self.logger
     
@@ -61,14 +97,17 @@ class InputHandler:
         self.logger.exception(f"{msg}: {e}")
 
     def __register_cmd(self, name: str, func: Callable[..., Any], description: str = "", legacy=False):
-        name = name.lower()
+        path = tuple(name.lower().split())
+        if not path:
+            raise SyntaxError("Command name must not be empty")
+        name = " ".join(path)
         if not description:
             description = "A command"
-        if ' ' in name:
-            raise SyntaxError("Command name must not have spaces")
         if name in self.commands:
             raise SyntaxError(f"Command '{name}' is already registered. If theese commands have a different case and they need to stay the same, downgrade the package version to 0.5.x")
-        self.commands[name] = {"cmd": func, "description": description, "legacy": legacy}
+        data = {"cmd": func, "description": description, "legacy": legacy}
+        self.commands[name] = data
+        self.command_tree.insert(path).command = data
 
     def register_command(self, name: str, func: Callable[..., Any], description: str = ""):
         """(DEPRECATED) Registers a command with its associated function. This will be deleted in v0.8.0"""
@@ -83,67 +122,158 @@ class InputHandler:
             return func
         return decorator
 
-    def start(self):
-        """Starts the input handler loop in a separate thread if thread mode is enabled."""
-        import threading, inspect
-        self.is_running = True
+    def group(self, name: str, description: str = "") -> CommandGroup:
+        """Returns a command group. Commands registered through it are run as "<group> <command> [args]"."""
+        path = tuple(name.lower().split())
+        if not path:
+            raise SyntaxError("Group name must not be empty")
+        node = self.command_tree.insert(path)
+        if description:
+            node.description = description
+        return CommandGroup(self, " ".join(path))
 
-        def _run_command(commands: dict, name: str, args: list):
-            """Executes a command from the command dictionary if it exists."""
-            command = commands.get(name)
-            if command:
-                func = command.get("cmd")
-                is_legacy = command.get("legacy", False)
-                if callable(func):
-                    sig = inspect.signature(func)
-                    has_var_args = any(p.kind == inspect.Parameter.VAR_POSITIONAL for p in sig.parameters.values())
-
-                    if has_var_args:
-                        final_args = args
-                    else:
-                        params = [p for p in sig.parameters.values() if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.POSITIONAL_ONLY)]
-                        final_args = args[:len(params)]
-
-                    if is_legacy:
-                        try:
-                            sig.bind(final_args)
-                        except TypeError as e:
-                            self.__warning(f"Argument error for legacy command '{name}': {e}")
-                            return
-                        
-                        try:
-                            warnings.warn("This way of running commands id Deprecated. And should be changed to the new decorator way.", DeprecationWarning, 2)
-                            func(final_args)
-                        except HandlerClosed as e:
-                            raise e
-                        except Exception as e:
-                            self.__exeption(f"An error occurred in legacy command '{name}'", e)
-                    else:
-                        try:
-                            sig.bind(*final_args) 
-                        except TypeError as e:
-                            self.__warning(f"Argument error for command '{name}': {e}")
-                            return
-                        try:
-                            func(*final_args)
-                        except HandlerClosed as e:
-                            raise e
-                        except Exception as e:
-                            self.__exeption(f"An error occurred in command '{name}'", e)
+    def lazy_command(self, name: str, target: str, *, description: str = "", warm: bool = False):
+        """Registers a command by its "package.module:function" path. The module is only imported when the command is first run, or in the background on start() if warm is True."""
+        self.__register_cmd(name, LazyCommand(target, warm=warm), description)
+
+    def warm_lazy_commands(self, only_marked: bool = False) -> threading.Thread | None:
+        """Imports the lazy commands in a background thread."""
+        lazy = [data["cmd"] for data in self.commands.values() if isinstance(data["cmd"], LazyCommand)]
+        return warm_commands([cmd for cmd in lazy if cmd.warm or not only_marked])
+
+    def _run_command(self, name: str, args: list):
+        """Executes a command from the command dictionary if it exists."""
+        command = self.commands.get(name)
+        if command:
+            func = command.get("cmd")
+            is_legacy = command.get("legacy", False)
+            if isinstance(func, LazyCommand):
+                try:
+                    func = func.resolve()
+                except Exception as e:
+                    self.__exeption(f"Failed to load command '{name}'", e)
+                    return
+            if callable(func):
+                sig = inspect.signature(func)
+                has_var_args = any(p.kind == inspect.Parameter.VAR_POSITIONAL for p in sig.parameters.values())
+
+                if has_var_args:
+                    final_args = args
                 else:
-                    raise ValueError(f"The command '{name}' is not callable.")
+                    params = [p for p in sig.parameters.values() if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.POSITIONAL_ONLY)]
+                    final_args = args[:len(params)]
+
+                if is_legacy:
+                    try:
+                        sig.bind(final_args)
+                    except TypeError as e:
+                        self.__warning(f"Argument error for legacy command '{name}': {e}")
+                        return
+                    
+                    try:
+                        warnings.warn("This way of running commands id Deprecated. And should be changed to the new decorator way.", DeprecationWarning, 2)
+                        profiler = active_profiler.get()
+                        emit_result(name, func(final_args) if profiler is None else profiler.runcall(func, final_args))
+                    except HandlerClosed as e:
+                        raise e
+                    except Exception as e:
+                        self.__exeption(f"An error occurred in legacy command '{name}'", e)
+                else:
+                    try:
+                        sig.bind(*final_args) 
+                    except TypeError as e:
+                        self.__warning(f"Argument error for command '{name}': {e}")
+                        return
+                    try:
+                        profiler = active_profiler.get()
+                        emit_result(name, func(*final_args) if profiler is None else profiler.runcall(func, *final_args))
+                    except HandlerClosed as e:
+                        raise e
+                    except Exception as e:
+                        self.__exeption(f"An error occurred in command '{name}'", e)
             else:
-                self.__warning(f"Command '{name}' not found.")
+                raise ValueError(f"The command '{name}' is not callable.")
+        else:
+            self.__warning(f"Command '{name}' not found.")
 
+    def _execute(self, text: str, scheduled: bool = False):
+        """Resolves a command line against the command tree and runs the matching command. scheduled marks runs started by the scheduler."""
+        recorder = get_recorder()
+        started = time.perf_counter()
+        try:
+            cmdargs = text.split(' ')
+            node, consumed, reached = self.command_tree.resolve(cmdargs)
+            if node is not None:
+                token = running_command.set(node.name)
+                try:
+                    self._run_command(node.name, cmdargs[consumed:])
+                finally:
+                    running_command.reset(token)
+            elif reached is not self.command_tree.root:
+                print("\n".join([f"Commands in '{' '.join(cmdargs[:len(reached.path)]).lower()}':"] + self.command_tree.help_lines(reached)))
+            else:
+                self.__warning(f"Unknown command: '{cmdargs[0].lower()}'")
+        finally:
+            if recorder is not None:
+                recorder.record_command(text, started, time.perf_counter() - started, scheduled)
+
+    def every(self, interval: str | float, command: str) -> ScheduledJob:
+        """Runs a command line repeatedly at a fixed rate, e.g. handler.every("5s", "stats")."""
+        seconds = parse_duration(interval)
+        return self.scheduler.schedule(command, seconds, seconds)
+
+    def after(self, delay: str | float, command: str) -> ScheduledJob:
+        """Runs a command line once after a delay, e.g. handler.after("10m", "backup")."""
+        return self.scheduler.schedule(command, parse_duration(delay))
+
+    def cancel_job(self, job_id: int) -> bool:
+        """Cancels a scheduled job. Returns False if no such job exists."""
+        return self.scheduler.cancel(job_id)
+
+    def _run_scheduled(self, job: ScheduledJob):
+        try:
+            self._execute(job.command, scheduled=True)
+        except HandlerClosed:
+            self.__info("Input Handler exited.")
+            self.is_running = False
+
+    def __schedule_cmd(self, when: str, command: tuple, repeat: bool):
+        if not command:
+            return self.__warning(f"Usage: {'every' if repeat else 'after'} <{'interval' if repeat else 'delay'}> <command> [args]")
+        node, _, _ = self.command_tree.resolve(list(command))
+        if node is None:
+            return self.__warning(f"Unknown command: '{command[0].lower()}'")
+        try:
+            job = self.every(when, " ".join(command)) if repeat else self.after(when, " ".join(command))
+        except ValueError as e:
+            return self.__warning(str(e))
+        print(f"Scheduled job {job.describe()}")
+
+    def __report_profile(self, profiler: cProfile.Profile, line: str, top: int, sort: str, output: str | None):
+        try:
+            print(format_profile(profiler, line, top, sort))
+        except TypeError:
+            return self.__warning(f"Nothing was profiled for '{line}'.")
+        if output:
+            try:
+                profiler.dump_stats(output)
+            except OSError as e:
+                return self.__warning(f"Could not write profile data: {e}")
+            print(f"Profile data written to '{output}'.")
+
+    def start(self):
+        """Starts the input handler loop in a separate thread if thread mode is enabled."""
+        import threading, inspect
+        self.is_running = True
+        self.warm_lazy_commands(only_marked=True)
 
         def _thread():
             """Continuously listens for user input and processes commands."""
             while self.is_running:
                 try:
                     with self.print_lock:
-                        if sys.stdout.isatty():
-                            sys.stdout.write(self.cursor)
-                            sys.stdout.flush()
+                        if sys.stdout.isatty() and terminal_output():
+                            write_text(self.cursor)
 
                     with input_lib.InputContext() as ctx:
                         using_raw_mode = getattr(ctx, 'using_raw_mode', True)
@@ -157,24 +287,15 @@ class InputHandler:
                                         if line:
                                             text = line.rstrip('\n\r')
                                             
-                                            if text and (not self.history or self.history[-1] != text):
-                                                self.history.append(text)
-                                            self.history_index = len(self.history)
+                                            self.editor.add_history(text)
                                             
                                             self.processing_command = True
-                                            cmdargs = text.split(' ')
-                                            command_name = cmdargs[0].lower()
-                                            args = cmdargs[1:]
-                                            if command_name in self.commands:
-                                                _run_command(self.commands, command_name, args)
-                                            else:
-                                                self.__warning(f"Unknown command: '{command_name}'")
+                                            self._execute(text)
                                             self.processing_command = False
                                             
                                             with self.print_lock:
-                                                if sys.stdout.isatty():
-                                                    sys.stdout.write(self.cursor)
-                                                    sys.stdout.flush()
+                                                if sys.stdout.isatty() and terminal_output():
+                                                    write_text(self.cursor)
 
                                     except HandlerClosed:
                                         raise
@@ -184,85 +305,25 @@ class InputHandler:
                                     import time
                                     time.sleep(0.05)
                         else:
+                            self.editor.cursor = self.cursor
                             while self.is_running:
                                 if input_lib.kbhit():
-                                    char = input_lib.getwch()
-                                    
-                                    if char == '\xe0' or char == '\x00':
-                                        try:
-                                            scancode = input_lib.getwch()
-        
-                                            if scancode == 'H':
-                                                if self.history_index > 0:
-                                                    self.history_index -= 1
-                                                    self.input_buffer = self.history[self.history_index]
-                                                    with self.print_lock:
-                                                        sys.stdout.write('\r' + ' ' * (shutil.get_terminal_size().columns - 1) + '\r')
-                                                        sys.stdout.write(self.cursor + self.input_buffer)
-                                                        sys.stdout.flush()
-                                                
-                                            elif scancode == 'P':
-                                                if self.history_index < len(self.history):
-                                                    self.history_index += 1
-                                                    
-                                                if self.history_index == len(self.history):
-                                                    self.input_buffer = ""
-                                                else:
-                                                    self.input_buffer = self.history[self.history_index]
-                                                    
-                                                with self.print_lock:
-                                                    sys.stdout.write('\r' + ' ' * (shutil.get_terminal_size().columns - 1) + '\r')
-                                                    sys.stdout.write(self.cursor + self.input_buffer)
-                                                    sys.stdout.flush()
-                                        except Exception:
-                                            pass
-
-                                    elif char == '\r':
-                                        if using_raw_mode:
+                                    for action, value in self.editor.feed_keys(input_lib.getwch()):
+                                        if action == OUTPUT:
+                                            if not terminal_output():
+                                                continue
                                             with self.print_lock:
-                                                sys.stdout.write('\n')
-                                                sys.stdout.flush()
-
-                                        text = self.input_buffer
-                                        self.input_buffer = ""
-                                        
-                                        if text:
-                                            if not self.history or self.history[-1] != text:
-                                                self.history.append(text)
-                                            self.history_index = len(self.history)
-                                            
-                                            self.processing_command = True
-                                            cmdargs = text.split(' ')
-                                            command_name = cmdargs[0].lower()
-                                            args = cmdargs[1:]
-                                            if command_name in self.commands:
-                                                _run_command(self.commands, command_name, args)
-                                            else:
-                                                self.__warning(f"Unknown command: '{command_name}'")
-                                            self.processing_command = False
-                                        
-                                        #break
-                                            
-                                    elif char == '\x08':
-                                        if len(self.input_buffer) > 0:
-                                            self.input_buffer = self.input_buffer[:-1]
-                                            if using_raw_mode:
-                                                with self.print_lock:
-                                                    sys.stdout.write('\b \b')
-                                                    sys.stdout.flush()
-                                    
-                                    elif char == '\x03':
-                                        self.__error("Input interrupted.")
-                                        self.is_running = False
-                                        return
-                                    
-                                    else:
-                                        if char.isprintable():
-                                            self.input_buffer += char
-                                            if using_raw_mode:
-                                                with self.print_lock:
-                                                    sys.stdout.write(char)
-                                                    sys.stdout.flush()
+                                                write_bytes(value)
+                                        elif action == SUBMIT:
+                                            if value:
+                                                self.processing_command = True
+                                                self._execute(value)
+                                                self.processing_command = False
+                                        elif action == INTERRUPT:
+                                            self.__error("Input interrupted.")
+                                            self.is_running = False
+                                            self.scheduler.stop()
+                                            return
 
                                 else:
                                     import time
@@ -275,6 +336,7 @@ class InputHandler:
                     self.__exeption("Input loop error", e)
                     break
             self.is_running = False
+            self.scheduler.stop()
         if self.thread_mode:
             self.thread = threading.Thread(target=_thread, daemon=True)
             self.thread.start()
@@ -283,11 +345,13 @@ class InputHandler:
 
     def register_default_commands(self):
         @self.command(name="help", description="Displays all the available commands")
-        def help():
-            str_out = "Available commands:\n"
-            for command, data in self.commands.items():
-                str_out += f"  {command}: {data['description']}\n"
-            print(str_out)
+        def help(*path):
+            if not path:
+                return print("\n".join(["Available commands:"] + self.command_tree.help_lines(self.command_tree.root)) + "\n")
+            _, _, group = self.command_tree.resolve(list(path))
+            if group is self.command_tree.root:
+                return self.__warning(f"Unknown command group: '{' '.join(path)}'")
+            print("\n".join([f"Commands in '{' '.join(path[:len(group.path)]).lower()}':"] + self.command_tree.help_lines(group)))
 
         @self.command(name="debug", description="If a logger is present changes the logging level to DEBUG.")
         def debug_mode():
@@ -309,6 +373,97 @@ class InputHandler:
                     handler.setLevel(new_level)
             self.__info(message)
 
+        @self.command(name="scrollback", description="Pages through recent output. Page 1 is the newest: scrollback [page]")
+        def scrollback(page: str = "1"):
+            if self.scrollback is None:
+                return self.__warning("Scrollback is disabled for this InputHandler instance.")
+            try:
+                page_num = max(1, int(page))
+            except ValueError:
+                return self.__warning(f"Invalid page number: '{page}'")
+
+            page_size = max(1, shutil.get_terminal_size().lines - 2)
+            total = len(self.scrollback)
+            pages = max(1, -(-total // page_size))
+            page_num = min(page_num, pages)
+            stop = total - (page_num - 1) * page_size
+            lines = self.scrollback.lines(max(0, stop - page_size), stop)
+            with self.scrollback.paused():
+                print("\n".join(lines + [f"-- page {page_num}/{pages} ({total} lines) --"]))
+
+        @self.command(name="grep", description="Searches recent output with a regular expression: grep <pattern>")
+        def grep(*pattern):
+            if self.scrollback is None:
+                return self.__warning("Scrollback is disabled for this InputHandler instance.")
+            if not pattern:
+                return self.__warning("Usage: grep <pattern>")
+            try:
+                matches = self.scrollback.search(" ".join(pattern))
+            except re.error as e:
+                return self.__warning(f"Invalid pattern: {e}")
+
+            with self.scrollback.paused():
+                print("\n".join([f"{num}: {line}" for num, line in matches] + [f"-- {len(matches)} match(es) --"]))
+
+        @self.command(name="every", description="Runs a command repeatedly: every <interval> <command> [args]")
+        def every(interval: str, *command):
+            self.__schedule_cmd(interval, command, repeat=True)
+
+        @self.command(name="after", description="Runs a command once after a delay: after <delay> <command> [args]")
+        def after(delay: str, *command):
+            self.__schedule_cmd(delay, command, repeat=False)
+
+        @self.command(name="jobs", description="Lists the scheduled jobs with their drift statistics")
+        def jobs(*args):
+            jobs = self.scheduler.jobs()
+            if not jobs:
+                return print("No scheduled jobs.")
+            print("\n".join(["Scheduled jobs:"] + [f"  {job.describe()}" for job in jobs]))
+
+        @self.command(name="cancel", description="Cancels a scheduled job: cancel <id|all>")
+        def cancel(job_id: str):
+            if job_id.lower() == "all":
+                return print(f"Cancelled {self.scheduler.cancel_all()} job(s).")
+            try:
+                cancelled = self.cancel_job(int(job_id.lstrip("#")))
+            except ValueError:
+                return self.__warning(f"Invalid job id: '{job_id}'")
+            if not cancelled:
+                return self.__warning(f"No scheduled job #{job_id.lstrip('#')}")
+            print(f"Cancelled job #{job_id.lstrip('#')}.")
+
+        @self.command(name="profile", description="Runs a command under cProfile and shows the hotspots: profile [-n top] [-s sort] [-o file.pstats] <command> [args]")
+        def profile(*args):
+            try:
+                top, sort, output, line = parse_options(args, PROFILE_USAGE)
+            except ValueError as e:
+                return self.__warning(str(e))
+
+            profiler = cProfile.Profile()
+            token = active_profiler.set(profiler)
+            try:
+                self._execute(line)
+            finally:
+                active_profiler.reset(token)
+            self.__report_profile(profiler, line, top, sort, output)
+
+        @self.command(name="memprofile", description="Runs a command under tracemalloc and shows the top allocations: memprofile [-n top] [-o file.snapshot] <command> [args]")
+        def memprofile(*args):
+            try:
+                top, _, output, line = parse_options(args, MEMPROFILE_USAGE, sort=False)
+            except ValueError as e:
+                return self.__warning(str(e))
+
+            with MemoryProfile() as mem:
+                self._execute(line)
+            print(mem.format(line, top))
+            if output:
+                try:
+                    mem.at_peak.dump(output)
+                except OSError as e:
+                    return self.__warning(f"Could not write snapshot: {e}")
+                print(f"Snapshot written to '{output}'.")
+
         @self.command(name="exit", description="Exits the Input Handler irreversibly.")
         def exit_thread():
             raise HandlerClosed("Handler was closed with exit command.")
\ No newline at end of file
@@ -0,0 +1,122 @@
+from typing import Any, Iterable
+
+class CommandNode:
+    """A node of the command tree. Nodes with a command are runnable, nodes with children are groups."""
+    __slots__ = ("path", "command", "description", "children")
+
+    def __init__(self, path: tuple[str, ...]):
+        self.path = path
+        self.command: dict[str, Any] | None = None
+        self.description = ""
+        # first word of the edge -> (edge words, child)
+        self.children: dict[str, tuple[tuple[str, ...], "CommandNode"]] = {}
+
+    @property
+    def name(self) -> str:
+        return " ".join(self.path)
+
+class CommandTree:
+    """
+    A radix tree of command paths split into words ("db export users").
+    Chains of single-child groups are compressed into one multi-word edge,
+    so resolving a command line costs one dict lookup per edge along its
+    path, independent of the total number of registered commands.
+    """
+    def __init__(self):
+        self.root = CommandNode(())
+
+    def insert(self, path: tuple[str, ...]) -> CommandNode:
+        """Returns the node for path, creating it (and splitting edges) if needed."""
+        node = self.root
+        i = 0
+        while i < len(path):
+            edge = node.children.get(path[i])
+            if edge is None:
+                child = CommandNode(path)
+                node.children[path[i]] = (path[i:], child)
+                return child
+
+            label, child = edge
+            rest = path[i:]
+            k = 1
+            while k < len(label) and k < len(rest) and label[k] == rest[k]:
+                k += 1
+
+            if k < len(label):
+                mid = CommandNode(path[:i + k])
+                mid.children[label[k]] = (label[k:], child)
+                node.children[path[i]] = (label[:k], mid)
+                child = mid
+            node = child
+            i += k
+        return node
+
+    def resolve(self, tokens: list[str]) -> tuple[CommandNode | None, int, CommandNode]:
+        """
+        Walks the tree along the (case-insensitive) tokens in one pass.
+        Returns the deepest runnable node, the number of tokens its path consumed,
+        and the deepest node reached (which may only be partially matched).
+        """
+        node = self.root
+        match: CommandNode | None = None
+        consumed = 0
+        i = 0
+        n = len(tokens)
+        while i < n:
+            edge = node.children.get(tokens[i].lower())
+            if edge is None:
+                break
+            label, child = edge
+            size = len(label)
+            if size > 1:
+                if i + size > n:
+                    if all(label[j] == tokens[i + j].lower() for j in range(1, n - i)):
+                        node = child
+                    break
+                if any(label[j] != tokens[i + j].lower() for j in range(1, size)):
+                    break
+            node = child
+            i += size
+            if node.command is not None:
+                match = node
+                consumed = i
+        return match, consumed, node
+
+    def iter_commands(self, node: CommandNode | None = None) -> Iterable[CommandNode]:
+        """Yields every runnable node below node (default: the root), in registration order."""
+        stack = [node or self.root]
+        while stack:
+            current = stack.pop()
+            if current.command is not None:
+                yield current
+            stack.extend(child for _, child in reversed(list(current.children.values())))
+
+    def help_lines(self, node: CommandNode) -> list[str]:
+        """Lists the commands and groups directly below node as "name: description" lines."""
+        entries = [node] if node is not self.root and not node.children else [child for _, child in node.children.values()]
+        lines = []
+        for entry in entries:
+            if entry.command is not None:
+                lines.append(f"  {entry.name}: {entry.command['description']}")
+            if entry.children:
+                lines.append(f"  {entry.name} ...: {entry.description or 'A command group'}")
+        return lines
+
+class CommandGroup:
+    """Registers commands below a common path, e.g. handler.group("db").command(name="export")."""
+    def __init__(self, handler: Any, path: str):
+        self.handler = handler
+        self.path = path
+
+    def command(self, *, name: str = "", description: str = ""):
+        """Registers a command of this group as a decorator."""
+        def decorator(func):
+            lname = name or func.__name__
+            return self.handler.command(name=f"{self.path} {lname}", description=description)(func)
+        return decorator
+
+    def lazy_command(self, name: str, target: str, *, description: str = "", warm: bool = False):
+        self.handler.lazy_command(f"{self.path} {name}", target, description=description, warm=warm)
+
+    def group(self, name: str, description: str = "") -> "CommandGroup":
+        return self.handler.group(f"{self.path} {name}", description)
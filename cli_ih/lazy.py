@@ -0,0 +1,59 @@
+from typing import Callable, Any, Iterable
+import importlib
+import threading
+
+class LazyCommand:
+    """
+    A command that is only imported from its "package.module:function" path
+    the first time it is run (or when it is warmed in the background).
+    """
+    def __init__(self, target: str, *, warm: bool = False):
+        module_name, sep, attr = target.partition(":")
+        if not sep or not module_name or not attr:
+            raise ValueError(f"Invalid command path '{target}'. Expected 'package.module:function'.")
+        self.target = target
+        self.warm = warm
+        self._module_name = module_name
+        self._attr = attr
+        self._func: Callable[..., Any] | None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<LazyCommand {self.target!r} loaded={self.loaded}>"
+
+    @property
+    def loaded(self) -> bool:
+        return self._func is not None
+
+    def resolve(self) -> Callable[..., Any]:
+        """Imports the target (once) and returns the command function."""
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    obj = importlib.import_module(self._module_name)
+                    for part in self._attr.split("."):
+                        obj = getattr(obj, part)
+                    if not callable(obj):
+                        raise TypeError(f"'{self.target}' is not callable.")
+                    self._func = obj
+        return self._func
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+def warm_commands(commands: Iterable[LazyCommand]) -> threading.Thread | None:
+    """Imports the given lazy commands in a background thread. Import errors are reported when the command is run."""
+    pending = [cmd for cmd in commands if not cmd.loaded]
+    if not pending:
+        return None
+
+    def _warm():
+        for cmd in pending:
+            try:
+                cmd.resolve()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=_warm, name="cli_ih-warmup", daemon=True)
+    thread.start()
+    return thread
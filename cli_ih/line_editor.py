@@ -0,0 +1,153 @@
+from typing import Callable, Any
+import codecs
+import re
+
+OUTPUT = "output"
+SUBMIT = "submit"
+INTERRUPT = "interrupt"
+
+# Runs of ordinary characters, or a single control character.
+_BYTE_TOKENS = re.compile(r"[^\x00-\x1f\x7f]+|[\x00-\x1f\x7f]")
+# Same for platform_input keys, where '\xe0' and '\x00' announce a scancode.
+_KEY_TOKENS = re.compile(r"[^\x00-\x1f\x7f\xe0]+|[\x00-\x1f\x7f\xe0]")
+
+_SCANCODES = {'H': 'up', 'P': 'down'}
+_CSI_FINALS = {'A': 'up', 'B': 'down'}
+
+class LineEditor:
+    """
+    The raw-mode line editing state machine (echo, backspace, history, Enter
+    and Ctrl-C), without any I/O. Input goes in as terminal bytes (feed) or as
+    platform_input keys (feed_keys), and each call returns a list of
+    (action, value) tuples:
+
+        (OUTPUT, bytes)    bytes to write to the terminal
+        (SUBMIT, str)      a line was entered
+        (INTERRUPT, None)  Ctrl-C was pressed; the rest of the input is dropped
+    """
+    def __init__(self, cursor: str = "", *, columns: Callable[[], int] | int = 80, encoding: str = "utf-8", echo: bool = True):
+        self.cursor = cursor
+        self.columns = columns
+        self.encoding = encoding
+        self.echo = echo
+        self.buffer = ""
+        self.history: list[str] = []
+        self.history_index = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._sequence: str | None = None
+        self._after_cr = False
+        self._clear_line = (0, b"")
+
+    def add_history(self, text: str):
+        """Appends a line to the history (unless it repeats the last one) and resets the history position."""
+        if text and (not self.history or self.history[-1] != text):
+            self.history.append(text)
+        self.history_index = len(self.history)
+
+    def redraw(self) -> bytes:
+        """Returns the bytes that clear the current line and draw the prompt and buffer again."""
+        columns = self.columns() if callable(self.columns) else self.columns
+        if self._clear_line[0] != columns:
+            self._clear_line = (columns, ('\r' + ' ' * (columns - 1) + '\r').encode(self.encoding))
+        return self._clear_line[1] + (self.cursor + self.buffer).encode(self.encoding, "replace")
+
+    def feed(self, data: bytes) -> list[tuple[str, Any]]:
+        """Processes raw terminal input (UTF-8 text with VT100 escape sequences), e.g. from a pty or socket."""
+        return self._process(self._decoder.decode(data), _BYTE_TOKENS)
+
+    def feed_keys(self, keys: str) -> list[tuple[str, Any]]:
+        """Processes keys as returned by platform_input.getwch."""
+        return self._process(keys, _KEY_TOKENS)
+
+    def _process(self, text: str, tokens: re.Pattern) -> list[tuple[str, Any]]:
+        if len(text) == 1 and ' ' <= text <= '~' and self._sequence is None:
+            # Fast path for a single typed ASCII character.
+            self._after_cr = False
+            self.buffer += text
+            return [(OUTPUT, text.encode())] if self.echo else []
+
+        actions: list[tuple[str, Any]] = []
+        out: list[str] = []
+        for token in tokens.findall(text):
+            if self._sequence is not None:
+                i = 0
+                while self._sequence is not None and i < len(token):
+                    self._sequence_char(token[i], out, actions)
+                    i += 1
+                if i == len(token):
+                    continue
+                token = token[i:]
+
+            char = token[0]
+            if len(token) > 1 or char > '\x1f' and char != '\x7f' and not (char == '\xe0' and tokens is _KEY_TOKENS):
+                self._after_cr = False
+                if not token.isprintable():
+                    token = "".join(c for c in token if c.isprintable())
+                self.buffer += token
+                if self.echo:
+                    out.append(token)
+            elif char == '\r' or char == '\n':
+                if char == '\n' and self._after_cr:
+                    self._after_cr = False
+                    continue
+                self._after_cr = char == '\r'
+                text_line = self.buffer
+                self.buffer = ""
+                self.add_history(text_line)
+                if self.echo:
+                    out.append('\n')
+                self._flush(out, actions)
+                actions.append((SUBMIT, text_line))
+            else:
+                self._after_cr = False
+                if char == '\x08' or char == '\x7f':
+                    if self.buffer:
+                        self.buffer = self.buffer[:-1]
+                        if self.echo:
+                            out.append('\b \b')
+                elif char == '\x03':
+                    self._flush(out, actions)
+                    actions.append((INTERRUPT, None))
+                    return actions
+                elif char == '\x1b' and tokens is _BYTE_TOKENS:
+                    self._sequence = "esc"
+                elif char in ('\xe0', '\x00') and tokens is _KEY_TOKENS:
+                    self._sequence = "scancode"
+        self._flush(out, actions)
+        return actions
+
+    def _sequence_char(self, char: str, out: list[str], actions: list[tuple[str, Any]]):
+        state = self._sequence
+        if state == "esc":
+            self._sequence = "csi" if char == '[' else "ss3" if char == 'O' else None
+            return
+        if state == "scancode":
+            key = _SCANCODES.get(char)
+            self._sequence = None
+        elif '\x40' <= char <= '\x7e':
+            key = _CSI_FINALS.get(char)
+            self._sequence = None
+        else:
+            # Parameter bytes of a CSI sequence.
+            return
+
+        if key == 'up':
+            if self.history_index > 0:
+                self.history_index -= 1
+                self.buffer = self.history[self.history_index]
+                self._redraw(out, actions)
+        elif key == 'down':
+            if self.history_index < len(self.history):
+                self.history_index += 1
+            self.buffer = "" if self.history_index == len(self.history) else self.history[self.history_index]
+            self._redraw(out, actions)
+
+    def _redraw(self, out: list[str], actions: list[tuple[str, Any]]):
+        if self.echo:
+            self._flush(out, actions)
+            actions.append((OUTPUT, self.redraw()))
+
+    def _flush(self, out: list[str], actions: list[tuple[str, Any]]):
+        if out:
+            actions.append((OUTPUT, "".join(out).encode(self.encoding, "replace")))
+            out.clear()
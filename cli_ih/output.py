@@ -0,0 +1,196 @@
+import atexit
+import os
+import select
+import sys
+import threading
+import time
+
+POLICY_BLOCK = "block"
+POLICY_DROP = "drop"
+POLICY_TRUNCATE = "truncate"
+
+class StdoutWriter:
+    """
+    Writes console output to a file descriptor from a dedicated thread,
+    through a bounded byte buffer, so a slow consumer (a stalled pipe or
+    SSH session) never blocks the threads that print. The writer thread
+    itself writes blocking.
+
+    When the buffer is full, policy decides what happens to new output:
+    "block" waits for space, "drop" discards it, and "truncate" discards it
+    and writes a "[... N bytes dropped ...]" marker once there is room again.
+
+    With nonblocking=True the descriptor is switched to non-blocking mode
+    (where the platform supports it, and unless it is a terminal or shares
+    its file with another standard stream), so close() can give up on a
+    stalled consumer. This applies to everything sharing the open file:
+    other writes to it, like the builtin print, can then fail with
+    BlockingIOError while the writer is active.
+    """
+    def __init__(self, fd: int | None = None, *, max_buffer: int = 1 << 20, policy: str = POLICY_BLOCK, chunk_size: int = 64 * 1024, nonblocking: bool = False):
+        if policy not in (POLICY_BLOCK, POLICY_DROP, POLICY_TRUNCATE):
+            raise ValueError(f"Unknown policy '{policy}'. Expected 'block', 'drop' or 'truncate'.")
+        if max_buffer < 1:
+            raise ValueError("max_buffer must be at least 1")
+        self.fd = sys.stdout.fileno() if fd is None else fd
+        self.max_buffer = max_buffer
+        self.policy = policy
+        self.chunk_size = chunk_size
+
+        self.bytes_written = 0
+        self.bytes_dropped = 0
+        self.stall_time = 0.0
+        self.blocked_time = 0.0
+
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._unmarked_drops = 0
+
+        self._was_blocking: bool | None = None
+        if nonblocking and not self._shares_file():
+            try:
+                # Output still buffered by sys.stdout must be written while the descriptor is blocking.
+                sys.stdout.flush()
+                self._was_blocking = os.get_blocking(self.fd)
+                os.set_blocking(self.fd, False)
+            except (AttributeError, OSError):
+                # Not supported for this descriptor (e.g. pipes on older Windows versions): the thread writes blocking.
+                self._was_blocking = None
+
+        self._thread = threading.Thread(target=self._run, name="cli_ih-stdout", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _shares_file(self) -> bool:
+        # O_NONBLOCK belongs to the open file, which a terminal shares between stdin, stdout and stderr.
+        # Making it non-blocking would break reading keys and writing to stderr.
+        try:
+            if os.isatty(self.fd):
+                return True
+            stat = os.fstat(self.fd)
+        except OSError:
+            return False
+        for other in (0, 1, 2):
+            if other == self.fd:
+                continue
+            try:
+                other_stat = os.fstat(other)
+            except OSError:
+                continue
+            if (other_stat.st_dev, other_stat.st_ino) == (stat.st_dev, stat.st_ino):
+                return True
+        return False
+
+    def write(self, data: bytes) -> int:
+        """Queues data for writing and returns the number of bytes accepted."""
+        if not data:
+            return 0
+        with self._cond:
+            if self._closed:
+                self.bytes_dropped += len(data)
+                return 0
+
+            if self._unmarked_drops:
+                marker = f"\n[... {self._unmarked_drops} bytes dropped ...]\n".encode()
+                if len(self._buffer) + len(marker) + len(data) <= self.max_buffer:
+                    self._buffer += marker
+                    self._unmarked_drops = 0
+
+            if len(self._buffer) + len(data) > self.max_buffer:
+                if self.policy == POLICY_BLOCK:
+                    started = time.perf_counter()
+                    # Output larger than the whole buffer is let through once the buffer is empty.
+                    while self._buffer and len(self._buffer) + len(data) > self.max_buffer and not self._closed:
+                        self._cond.wait()
+                    self.blocked_time += time.perf_counter() - started
+                    if self._closed:
+                        self.bytes_dropped += len(data)
+                        return 0
+                else:
+                    self.bytes_dropped += len(data)
+                    if self.policy == POLICY_TRUNCATE:
+                        self._unmarked_drops += len(data)
+                    return 0
+
+            self._buffer += data
+            self._cond.notify_all()
+            return len(data)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Waits until every queued byte was written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._buffer or self._closed, timeout)
+
+    def close(self, timeout: float | None = 5.0):
+        """Writes the remaining output (waiting up to timeout seconds), stops the thread and restores the descriptor."""
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        if self._was_blocking is not None:
+            try:
+                os.set_blocking(self.fd, self._was_blocking)
+            except OSError:
+                pass
+            self._was_blocking = None
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            return {
+                "bytes_written": self.bytes_written,
+                "bytes_dropped": self.bytes_dropped,
+                "bytes_buffered": len(self._buffer),
+                "stall_time": self.stall_time,
+                "blocked_time": self.blocked_time,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                chunk = bytes(self._buffer[:self.chunk_size])
+
+            if self._was_blocking is None:
+                # Blocking writes: wait for the consumer here so stalls are still accounted for.
+                self._wait_writable(0.0)
+
+            try:
+                written = os.write(self.fd, chunk)
+            except BlockingIOError:
+                written = 0
+            except OSError:
+                # The consumer went away; everything still queued is lost.
+                with self._cond:
+                    self.bytes_dropped += len(self._buffer)
+                    self._buffer.clear()
+                    self._closed = True
+                    self._cond.notify_all()
+                return
+
+            if written == 0:
+                self._wait_writable(0.01)
+                continue
+
+            with self._cond:
+                del self._buffer[:written]
+                self.bytes_written += written
+                self._cond.notify_all()
+
+    def _wait_writable(self, fallback_sleep: float):
+        started = time.perf_counter()
+        try:
+            _, writable, _ = select.select([], [self.fd], [], 0)
+            while not writable and not self._closed:
+                _, writable, _ = select.select([], [self.fd], [], 1.0)
+        except (OSError, ValueError):
+            # select() does not support this descriptor (e.g. on Windows).
+            time.sleep(fallback_sleep)
+        self.stall_time += time.perf_counter() - started
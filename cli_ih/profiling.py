@@ -0,0 +1,130 @@
+from contextvars import ContextVar
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import tracemalloc
+
+# The profiler of the running `profile` command. Commands check it when they are called,
+# so sync commands that AsyncInputHandler runs in worker threads are profiled too.
+active_profiler: ContextVar[cProfile.Profile | None] = ContextVar("cli_ih_active_profiler", default=None)
+# The running `memprofile`, so sync commands run in worker threads can install its hook there.
+active_memory_profile: ContextVar["MemoryProfile | None"] = ContextVar("cli_ih_active_memory_profile", default=None)
+
+PROFILE_USAGE = "Usage: profile [-n top] [-s sort] [-o file.pstats] <command> [args]"
+MEMPROFILE_USAGE = "Usage: memprofile [-n top] [-o file.snapshot] <command> [args]"
+
+def parse_options(args: tuple, usage: str, sort: bool = True) -> tuple[int, str, str | None, str]:
+    """Parses the leading options of profile/memprofile. Returns (top, sort, output file, command line)."""
+    top, sort_key, output = 15, "cumulative", None
+    args = list(args)
+    flags = ("-n", "-s", "-o") if sort else ("-n", "-o")
+    while args and args[0] in flags:
+        if len(args) < 2:
+            raise ValueError(usage)
+        flag, value = args.pop(0), args.pop(0)
+        if flag == "-n":
+            try:
+                top = max(1, int(value))
+            except ValueError:
+                raise ValueError(f"Invalid number of entries: '{value}'")
+        elif flag == "-s":
+            if value not in pstats.Stats.sort_arg_dict_default:
+                raise ValueError(f"Invalid sort key: '{value}'")
+            sort_key = value
+        else:
+            output = value
+    if not args:
+        raise ValueError(usage)
+    return top, sort_key, output, " ".join(args)
+
+def format_profile(profiler: cProfile.Profile, command: str, top: int, sort: str) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return f"Profile of '{command}' (top {top} by {sort}):\n{stream.getvalue().strip()}"
+
+class MemoryProfile:
+    """
+    Takes tracemalloc snapshots around a command, starting tracemalloc only if it was not running yet.
+    A profile hook also takes a snapshot whenever a function returns with the traced memory at a new
+    high, so temporary allocations that are freed before the command returns still show up.
+    """
+    def __init__(self):
+        self._started = False
+        self.before: tracemalloc.Snapshot | None = None
+        self.at_peak: tracemalloc.Snapshot | None = None
+        self.after: tracemalloc.Snapshot | None = None
+        self.peak = 0
+        self._sampled = 0
+        self._lock = threading.Lock()
+        self._hooked = False
+        self._token = None
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+        self._sampled = tracemalloc.get_traced_memory()[0]
+        self._token = active_memory_profile.set(self)
+        self._hooked = self._install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._hooked:
+            sys.setprofile(None)
+        active_memory_profile.reset(self._token)
+        self.after = tracemalloc.take_snapshot()
+        current, self.peak = tracemalloc.get_traced_memory()
+        if self.at_peak is None or current >= self._sampled:
+            self.at_peak = self.after
+            self._sampled = current
+        if self._started:
+            tracemalloc.stop()
+
+    def runcall(self, func, *args):
+        """Calls func with the peak tracking hook installed in the current thread, e.g. a worker thread running a sync command."""
+        hooked = self._install()
+        try:
+            return func(*args)
+        finally:
+            if hooked:
+                sys.setprofile(None)
+
+    def _install(self) -> bool:
+        # Another profiler (e.g. `profile memprofile ...` or a debugger) keeps its hook; only the
+        # memory still held after the command is reported then.
+        if sys.getprofile() is not None:
+            return False
+        sys.setprofile(self._hook)
+        return True
+
+    def _hook(self, frame, event, arg):
+        if event != "return" and event != "c_return":
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        # Only resnapshot for a noticeably higher peak, since a snapshot costs time proportional to the traces.
+        if current > self._sampled + max(64 * 1024, self._sampled // 20):
+            with self._lock:
+                if current > self._sampled:
+                    self._sampled = current
+                    self.at_peak = tracemalloc.take_snapshot()
+
+    def format(self, command: str, top: int) -> str:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        before = self.before.filter_traces(ignore)
+        at_peak = self.at_peak.filter_traces(ignore).compare_to(before, "lineno")
+        retained = self.after.filter_traces(ignore).compare_to(before, "lineno")
+        lines = [f"Memory profile of '{command}' (peak {self.peak / 1024:.1f} KiB):"]
+        if self._hooked:
+            lines.append(f" Top {top} by size at the peak ({self._sampled / 1024:.1f} KiB):")
+            lines += [f"  {stat}" for stat in at_peak[:top]]
+        else:
+            lines.append(" Allocations at the peak are not available while another profiler is active.")
+        lines.append(f" Top {top} by size still held after the command:")
+        lines += [f"  {stat}" for stat in retained[:top]]
+        return "\n".join(lines)
@@ -0,0 +1,268 @@
+from typing import Any, Iterator, NamedTuple
+import asyncio
+import os
+import struct
+import threading
+import time
+from . import platform_input as input_lib
+from .exceptions import HandlerClosed
+from .line_editor import OUTPUT, SUBMIT, INTERRUPT
+from .utils import set_recorder, get_recorder, write_bytes, terminal_output
+
+MAGIC = b"CIHR\x01"
+
+EVENT_INPUT = 1
+EVENT_OUTPUT = 2
+EVENT_COMMAND = 3
+# A command run started by the scheduler, with the same payload as EVENT_COMMAND.
+EVENT_SCHEDULED = 4
+
+# kind, seconds since the recording started, payload size
+_HEADER = struct.Struct("<BdI")
+# command duration, followed by the command line
+_DURATION = struct.Struct("<d")
+
+class TraceEvent(NamedTuple):
+    kind: int
+    time: float
+    data: str
+    duration: float = 0.0
+
+class SessionRecorder:
+    """
+    Records a session into a compact binary trace: every key returned by
+    platform_input.getwch, every safe_print message and the duration of
+    every dispatched command (tagged when the scheduler started it), each
+    stamped with its time since the start.
+
+        with SessionRecorder("session.trace"):
+            handler.start()
+            ...
+    """
+    def __init__(self, path: str | os.PathLike, *, buffer_size: int = 64 * 1024):
+        self.path = path
+        self._file = open(path, "wb", buffering=buffer_size)
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._original_getwch = None
+        self.events = 0
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def install(self) -> "SessionRecorder":
+        """Starts recording input, output and command timings."""
+        if self._original_getwch is None:
+            original = self._original_getwch = input_lib.getwch
+
+            def getwch():
+                char = original()
+                self.record_input(char)
+                return char
+
+            input_lib.getwch = getwch
+        set_recorder(self)
+        return self
+
+    def uninstall(self):
+        """Stops recording. The trace file stays open until close()."""
+        if self._original_getwch is not None:
+            input_lib.getwch = self._original_getwch
+            self._original_getwch = None
+        if get_recorder() is self:
+            set_recorder(None)
+
+    def close(self):
+        self.uninstall()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _write(self, kind: int, data: bytes, timestamp: float | None = None):
+        ts = (time.perf_counter() if timestamp is None else timestamp) - self._start
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(_HEADER.pack(kind, ts, len(data)))
+            self._file.write(data)
+            self.events += 1
+
+    def record_input(self, char: str):
+        self._write(EVENT_INPUT, char.encode("utf-8", "surrogatepass"))
+
+    def record_output(self, msg: str):
+        self._write(EVENT_OUTPUT, msg.encode("utf-8", "replace"))
+
+    def record_command(self, line: str, started: float, duration: float, scheduled: bool = False):
+        """Records a dispatched command line. started is a time.perf_counter() value."""
+        self._write(EVENT_SCHEDULED if scheduled else EVENT_COMMAND, _DURATION.pack(duration) + line.encode("utf-8", "replace"), started)
+
+def read_trace(path: str | os.PathLike) -> Iterator[TraceEvent]:
+    """Yields the events of a trace file in recording order."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{path}' is not a cli_ih session trace")
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            kind, ts, size = _HEADER.unpack(header)
+            payload = f.read(size)
+            if kind in (EVENT_COMMAND, EVENT_SCHEDULED):
+                (duration,) = _DURATION.unpack_from(payload)
+                yield TraceEvent(kind, ts, payload[_DURATION.size:].decode("utf-8", "replace"), duration)
+            else:
+                yield TraceEvent(kind, ts, payload.decode("utf-8", "surrogatepass" if kind == EVENT_INPUT else "replace"))
+
+class CommandTiming(NamedTuple):
+    command: str
+    recorded: float
+    replayed: float
+    lag: float
+    # The resolved command ("db export users"), without arguments.
+    name: str = ""
+
+class ReplayReport:
+    """The per-command timings of a replay compared to the recording."""
+    def __init__(self, speed: float | None):
+        self.speed = speed
+        self.timings: list[CommandTiming] = []
+        self.recorded_total = 0.0
+        self.replayed_total = 0.0
+
+    def summary(self, top: int = 10) -> str:
+        """Returns a table of the commands whose duration changed the most."""
+        by_name: dict[str, list[CommandTiming]] = {}
+        for timing in self.timings:
+            by_name.setdefault(timing.name or timing.command.split(" ", 1)[0], []).append(timing)
+
+        rows = []
+        for name, timings in by_name.items():
+            recorded = sum(t.recorded for t in timings) / len(timings)
+            replayed = sum(t.replayed for t in timings) / len(timings)
+            rows.append((abs(replayed - recorded), name, len(timings), recorded, replayed))
+        rows.sort(reverse=True)
+
+        speed = "max speed" if not self.speed else f"{self.speed:g}x speed"
+        lines = [f"Replayed {len(self.timings)} command(s) at {speed}: recorded {self.recorded_total * 1000:.1f}ms, replayed {self.replayed_total * 1000:.1f}ms"]
+        for _, name, count, recorded, replayed in rows[:top]:
+            change = (replayed - recorded) / recorded * 100 if recorded else 0.0
+            lines.append(f"  {name}: {count} run(s), recorded {recorded * 1000:.2f}ms, replayed {replayed * 1000:.2f}ms ({change:+.1f}%)")
+        if self.timings and self.speed:
+            lines.append(f"  max dispatch lag: {max(t.lag for t in self.timings) * 1000:.2f}ms")
+        return "\n".join(lines)
+
+class _Replay:
+    """
+    The replay plan of a trace, shared by replay() and areplay().
+
+    When the trace has key events, the keys are fed through handler.editor at
+    their recorded offsets and the lines they submit are dispatched; the
+    recorded command events then only provide the timings to compare with.
+    Otherwise the typed command events are dispatched directly. Runs started
+    by the scheduler are dispatched at their recorded offsets, and the every
+    and after commands are skipped so those runs do not happen twice.
+    """
+    def __init__(self, path: str | os.PathLike, handler: Any, speed: float | None):
+        self.handler = handler
+        self.speed = speed
+        self.report = ReplayReport(speed)
+        events = [event for event in read_trace(path) if event.kind != EVENT_OUTPUT]
+        self.keys = any(event.kind == EVENT_INPUT for event in events)
+        if self.keys:
+            # Typed commands come from the keys; their recorded durations are matched by line, in order.
+            self._recorded: dict[str, list[float]] = {}
+            for event in events:
+                if event.kind == EVENT_COMMAND:
+                    self._recorded.setdefault(event.data, []).append(event.duration)
+            events = [event for event in events if event.kind != EVENT_COMMAND]
+        origin = events[0].time if events else 0.0
+        self.events = [event._replace(time=event.time - origin) for event in events]
+        self.start = time.perf_counter()
+
+    def delay(self, event: TraceEvent) -> float:
+        return self.start + event.time / self.speed - time.perf_counter() if self.speed else 0.0
+
+    def commands(self, event: TraceEvent) -> list[tuple[str, float, bool]] | None:
+        """Returns the (line, recorded duration, scheduled) commands to dispatch for an event, or None to stop."""
+        if event.kind == EVENT_SCHEDULED:
+            return [(event.data, event.duration, True)]
+        if event.kind == EVENT_COMMAND:
+            return [] if self._schedules(event.data) else [(event.data, event.duration, False)]
+
+        commands = []
+        for action, value in self.handler.editor.feed_keys(event.data):
+            if action == OUTPUT:
+                if not terminal_output():
+                    continue
+                with self.handler.print_lock:
+                    write_bytes(value)
+            elif action == SUBMIT:
+                durations = self._recorded.get(value)
+                duration = durations.pop(0) if durations else 0.0
+                if value and not self._schedules(value):
+                    commands.append((value, duration, False))
+            elif action == INTERRUPT:
+                commands.append(None)
+        return commands
+
+    def _schedules(self, line: str) -> bool:
+        node, _, _ = self.handler.command_tree.resolve(line.split(' '))
+        return node is not None and node.name in ("every", "after")
+
+    def add(self, event: TraceEvent, line: str, recorded: float, began: float, elapsed: float):
+        lag = began - self.start - event.time / self.speed if self.speed else 0.0
+        node, _, _ = self.handler.command_tree.resolve(line.split(' '))
+        name = node.name if node is not None else line.split(" ", 1)[0].lower()
+        self.report.timings.append(CommandTiming(line, recorded, elapsed, lag, name))
+        self.report.recorded_total += recorded
+        self.report.replayed_total += elapsed
+
+def replay(path: str | os.PathLike, handler: Any, *, speed: float | None = 1.0) -> ReplayReport:
+    """
+    Replays a trace on an InputHandler, at the original pace scaled by speed
+    (None or 0 for maximum speed): the recorded keys (or, without them, the
+    recorded command lines) and scheduled runs. Reports how the command
+    durations compare to the recording. Stops at exit or Ctrl-C.
+    """
+    plan = _Replay(path, handler, speed)
+    for event in plan.events:
+        delay = plan.delay(event)
+        if delay > 0:
+            time.sleep(delay)
+        for command in plan.commands(event):
+            if command is None:
+                return plan.report
+            line, recorded, scheduled = command
+            began = time.perf_counter()
+            try:
+                handler._execute(line, scheduled)
+            except HandlerClosed:
+                return plan.report
+            finally:
+                plan.add(event, line, recorded, began, time.perf_counter() - began)
+    return plan.report
+
+async def areplay(path: str | os.PathLike, handler: Any, *, speed: float | None = 1.0) -> ReplayReport:
+    """The AsyncInputHandler version of replay(). Must be awaited on the loop the commands should run on."""
+    plan = _Replay(path, handler, speed)
+    for event in plan.events:
+        delay = plan.delay(event)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for command in plan.commands(event):
+            if command is None:
+                return plan.report
+            line, recorded, scheduled = command
+            began = time.perf_counter()
+            try:
+                await handler._execute(line, scheduled)
+            except HandlerClosed:
+                return plan.report
+            finally:
+                plan.add(event, line, recorded, began, time.perf_counter() - began)
+    return plan.report
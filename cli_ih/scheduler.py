@@ -0,0 +1,244 @@
+from typing import Callable, Any, Awaitable
+import asyncio
+import heapq
+import itertools
+import re
+import threading
+import time
+
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$", re.IGNORECASE)
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: str | float) -> float:
+    """Parses "500ms", "5s", "2m", "1h" or a plain number of seconds."""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = _DURATION_RE.match(value)
+        if not match:
+            raise ValueError(f"Invalid duration: '{value}'. Use e.g. 500ms, 5s, 2m or 1h.")
+        seconds = float(match.group(1)) * _UNITS[(match.group(2) or "s").lower()]
+    if seconds < 0:
+        raise ValueError("Duration must not be negative")
+    return seconds
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    if seconds < 120:
+        return f"{seconds:g}s"
+    if seconds < 7200:
+        return f"{seconds / 60:g}m"
+    return f"{seconds / 3600:g}h"
+
+class ScheduledJob:
+    """A command line scheduled to run once after a delay, or repeatedly at a fixed rate."""
+    __slots__ = ("id", "command", "interval", "due", "runs", "skipped", "last_drift", "max_drift", "total_drift", "cancelled", "running")
+
+    def __init__(self, job_id: int, command: str, due: float, interval: float | None):
+        self.id = job_id
+        self.command = command
+        self.interval = interval
+        self.due = due
+        self.runs = 0
+        self.skipped = 0
+        self.last_drift = 0.0
+        self.max_drift = 0.0
+        self.total_drift = 0.0
+        self.cancelled = False
+        self.running = False
+
+    @property
+    def mean_drift(self) -> float:
+        return self.total_drift / self.runs if self.runs else 0.0
+
+    def describe(self, now: float | None = None) -> str:
+        now = time.monotonic() if now is None else now
+        kind = f"every {format_duration(self.interval)}" if self.interval is not None else "once"
+        skipped = f", skipped {self.skipped}" if self.skipped else ""
+        return (f"#{self.id} {kind}: {self.command} (runs {self.runs}{skipped}, next in {format_duration(max(0.0, self.due - now))}, "
+                f"drift last {format_duration(self.last_drift)} avg {format_duration(self.mean_drift)} max {format_duration(self.max_drift)})")
+
+class _JobQueue:
+    """A heap of jobs ordered by due time. Cancelled jobs are dropped lazily when they reach the top."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: list[tuple[float, int, ScheduledJob]] = []
+        self._jobs: dict[int, ScheduledJob] = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+
+    def schedule(self, command: str, delay: float, interval: float | None = None) -> ScheduledJob:
+        if interval is not None and interval <= 0:
+            raise ValueError("Interval must be positive")
+        with self._lock:
+            job = ScheduledJob(next(self._ids), command, time.monotonic() + delay, interval)
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (job.due, next(self._seq), job))
+        self._wakeup()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job.cancelled = True
+        return True
+
+    def cancel_all(self) -> int:
+        with self._lock:
+            count = len(self._jobs)
+            for job in self._jobs.values():
+                job.cancelled = True
+            self._jobs.clear()
+            self._heap.clear()
+        return count
+
+    def jobs(self) -> list[ScheduledJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.id)
+
+    def _pop_due(self, now: float) -> tuple[list[tuple[ScheduledJob, float]], float | None]:
+        """Returns the jobs due at now with their drift (rescheduling repeating ones) and the time of the next due job."""
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and (heap[0][2].cancelled or heap[0][0] <= now):
+                _, _, job = heapq.heappop(heap)
+                if job.cancelled:
+                    continue
+                drift = now - job.due
+                due.append((job, drift))
+
+                if job.interval is None:
+                    self._jobs.pop(job.id, None)
+                else:
+                    # Fixed rate: keep the original phase and skip the runs that were missed.
+                    intervals = max(1, int(drift // job.interval) + 1)
+                    job.skipped += intervals - 1
+                    job.due += job.interval * intervals
+                    heapq.heappush(heap, (job.due, next(self._seq), job))
+            next_due = heap[0][0] if heap else None
+        return due, next_due
+
+    @staticmethod
+    def _count_run(job: ScheduledJob, drift: float):
+        # Only runs that actually start are counted, so skipped runs do not show up in the drift stats.
+        job.runs += 1
+        job.last_drift = drift
+        job.total_drift += drift
+        if drift > job.max_drift:
+            job.max_drift = drift
+
+    def _wakeup(self):
+        pass
+
+class ThreadScheduler(_JobQueue):
+    """Runs every job from a single timer thread, which is started on the first schedule() call."""
+    def __init__(self, execute: Callable[[ScheduledJob], Any]):
+        super().__init__()
+        self._execute = execute
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+        # Bumped by every wakeup, so one arriving while the thread is not waiting yet is not lost.
+        self._generation = 0
+
+    def schedule(self, command: str, delay: float, interval: float | None = None) -> ScheduledJob:
+        job = super().schedule(command, delay, interval)
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="cli_ih-scheduler", daemon=True)
+            self._thread.start()
+        return job
+
+    def stop(self):
+        self.cancel_all()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread = None
+
+    def _wakeup(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify()
+
+    def _run(self):
+        while not self._stopped:
+            with self._cond:
+                generation = self._generation
+            due, next_due = self._pop_due(time.monotonic())
+            for job, drift in due:
+                self._count_run(job, drift)
+                job.running = True
+                try:
+                    self._execute(job)
+                except Exception:
+                    pass
+                finally:
+                    job.running = False
+            if due:
+                continue
+            with self._cond:
+                if self._stopped:
+                    break
+                if self._generation != generation:
+                    continue
+                self._cond.wait(None if next_due is None else max(0.0, next_due - time.monotonic()))
+
+class AsyncScheduler(_JobQueue):
+    """Runs the jobs as tasks on an event loop. A repeating job is skipped while its previous run is still going."""
+    def __init__(self, execute: Callable[[ScheduledJob], Awaitable[Any]]):
+        super().__init__()
+        self._execute = execute
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._event: asyncio.Event | None = None
+
+    def _wakeup(self):
+        loop, event = self._loop, self._event
+        if loop is not None and event is not None:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass
+
+    async def run(self):
+        """Processes the jobs until cancelled. Must be awaited on the loop that should run them."""
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        tasks: set[asyncio.Task] = set()
+        try:
+            while True:
+                due, next_due = self._pop_due(time.monotonic())
+                for job, drift in due:
+                    if job.running:
+                        job.skipped += 1
+                        continue
+                    self._count_run(job, drift)
+                    task = self._loop.create_task(self._run_job(job))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if due:
+                    continue
+                self._event.clear()
+                try:
+                    timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+                    await asyncio.wait_for(self._event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._loop = None
+            self._event = None
+
+    async def _run_job(self, job: ScheduledJob):
+        job.running = True
+        try:
+            await self._execute(job)
+        except Exception:
+            pass
+        finally:
+            job.running = False
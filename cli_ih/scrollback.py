@@ -0,0 +1,105 @@
+from array import array
+from contextlib import contextmanager
+import re
+import threading
+
+class ScrollbackBuffer:
+    """
+    A fixed-memory ring buffer of recent output lines.
+    Lines are stored UTF-8 encoded in a single bytearray, with their
+    positions kept in two preallocated offset arrays. Old lines are
+    evicted as soon as new output overwrites their bytes.
+    """
+    def __init__(self, capacity: int = 1 << 20, max_lines: int = 50_000):
+        if capacity < 1 or max_lines < 1:
+            raise ValueError("capacity and max_lines must be at least 1")
+        self.capacity = capacity
+        self.max_lines = max_lines
+        self._data = bytearray(capacity)
+        # Starts are logical positions that only grow; the physical offset is start % capacity.
+        self._starts = array('Q', bytes(8 * max_lines))
+        self._lengths = array('L', bytes(array('L').itemsize * max_lines))
+        self._first = 0
+        self._count = 0
+        self._head = 0
+        self._lock = threading.Lock()
+        self._paused = threading.local()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @contextmanager
+    def paused(self):
+        """Stops recording output written by the current thread, e.g. while showing the scrollback itself."""
+        self._paused.active = True
+        try:
+            yield
+        finally:
+            self._paused.active = False
+
+    def is_paused(self) -> bool:
+        """Whether output written by the current thread is not recorded."""
+        return getattr(self._paused, "active", False)
+
+    def write(self, text: str):
+        """Records every line of text."""
+        if self.is_paused():
+            return
+        with self._lock:
+            for line in text.split('\n'):
+                self._append(line.encode('utf-8', 'replace'))
+
+    def _append(self, data: bytes):
+        # Must be called with self._lock held.
+        capacity = self.capacity
+        if len(data) > capacity:
+            data = data[-capacity:]
+        size = len(data)
+
+        start = self._head
+        offset = start % capacity
+        if offset + size > capacity:
+            # Lines are never split across the end of the buffer.
+            start += capacity - offset
+            offset = 0
+        end = start + size
+
+        starts, lengths, max_lines = self._starts, self._lengths, self.max_lines
+        while self._count and (self._count == max_lines or starts[self._first] < end - capacity):
+            self._first = (self._first + 1) % max_lines
+            self._count -= 1
+
+        self._data[offset:offset + size] = data
+        slot = (self._first + self._count) % max_lines
+        starts[slot] = start
+        lengths[slot] = size
+        self._count += 1
+        self._head = end
+
+    def _line(self, index: int) -> bytes:
+        slot = (self._first + index) % self.max_lines
+        offset = self._starts[slot] % self.capacity
+        return bytes(self._data[offset:offset + self._lengths[slot]])
+
+    def lines(self, start: int = 0, stop: int | None = None) -> list[str]:
+        """Returns the stored lines in [start, stop), oldest first. Negative indexes count from the newest line."""
+        with self._lock:
+            start, stop, _ = slice(start, stop).indices(self._count)
+            return [self._line(i).decode('utf-8', 'replace') for i in range(start, stop)]
+
+    def search(self, pattern: str, ignore_case: bool = False) -> list[tuple[int, str]]:
+        """Returns (line number, line) for every stored line matching the regular expression."""
+        regex = re.compile(pattern.encode('utf-8'), re.IGNORECASE if ignore_case else 0)
+        with self._lock:
+            matches = []
+            for i in range(self._count):
+                line = self._line(i)
+                if regex.search(line):
+                    matches.append((i + 1, line.decode('utf-8', 'replace')))
+            return matches
+
+    def clear(self):
+        with self._lock:
+            self._first = 0
+            self._count = 0
+            self._head = 0
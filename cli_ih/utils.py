@@ -1,15 +1,155 @@
+from typing import Any
 import shutil
 import sys
 import threading
 import os
 import logging
+import time
+import json
+import math
+import atexit
+import asyncio
+import copy
+import queue
+from json.encoder import encode_basestring
+from contextvars import ContextVar
 
 _HANDLER = None
+_THROTTLE = None
+_JSONL = None
+_RECORDER = None
+_WRITER = None
+_LOOP_THREAD: int | None = None
+# The command being run by the current thread or task. Scheduled runs happen at the same time as typed commands,
+# so this can not be a handler attribute.
+running_command: ContextVar[str | None] = ContextVar("cli_ih_running_command", default=None)
+
+# (function, arguments, (processing_command, current_command, scrollback paused on the loop thread or None))
+_LOOP_OUTPUT: "queue.SimpleQueue[tuple[Any, tuple, tuple]]" = queue.SimpleQueue()
+_LOOP_PRINTER: threading.Thread | None = None
+_LOOP_PRINTER_LOCK = threading.Lock()
+_PRINTER_STATE = threading.local()
 
 def register_handler(handler):
     global _HANDLER
     _HANDLER = handler
 
+def register_loop_thread(thread_id: int | None):
+    """
+    Marks the thread running the AsyncInputHandler event loop (None to unmark).
+    Output produced on that thread is handed to a printer thread instead of
+    taking print_lock or writing to stdout there. Unmarking waits (up to 5
+    seconds) until the queued output was written.
+    """
+    global _LOOP_THREAD
+    if thread_id is not None:
+        _ensure_printer()
+    _LOOP_THREAD = thread_id
+    if thread_id is None and _LOOP_PRINTER is not None:
+        drained = threading.Event()
+        _LOOP_OUTPUT.put((drained.set, (), (False, None, None)))
+        drained.wait(5.0)
+
+def _ensure_printer():
+    global _LOOP_PRINTER
+    if _LOOP_PRINTER is None:
+        with _LOOP_PRINTER_LOCK:
+            if _LOOP_PRINTER is None:
+                _LOOP_PRINTER = threading.Thread(target=_loop_printer, name="cli_ih-printer", daemon=True)
+                _LOOP_PRINTER.start()
+
+def _loop_printer():
+    while True:
+        func, args, state = _LOOP_OUTPUT.get()
+        # Render the prompt (and JSONL command) as they were when the output was produced, not as they are now.
+        _PRINTER_STATE.snapshot = state
+        try:
+            if state[2] is not None:
+                # The output was produced inside scrollback.paused() on the loop thread.
+                with state[2].paused():
+                    func(*args)
+            else:
+                func(*args)
+        except Exception:
+            pass
+        finally:
+            _PRINTER_STATE.snapshot = None
+
+def _on_loop_thread() -> bool:
+    return _LOOP_THREAD is not None and threading.get_ident() == _LOOP_THREAD
+
+def _defer(func, *args):
+    scrollback = getattr(_HANDLER, "scrollback", None) if _HANDLER is not None else None
+    paused = scrollback if scrollback is not None and scrollback.is_paused() else None
+    state = (bool(getattr(_HANDLER, "processing_command", False)), _current_command(), paused)
+    _LOOP_OUTPUT.put((func, args, state))
+
+def call_output(func, *args):
+    """Runs an output function on the printer thread when called from the event loop thread, and right away otherwise."""
+    if _on_loop_thread():
+        _defer(func, *args)
+    else:
+        func(*args)
+
+async def aprint(*values: object, sep: str = " ", flush: bool = False):
+    """
+    The asyncio version of safe_print. The message is handed to the printer
+    thread, so the event loop never waits for print_lock or a slow stdout.
+    With flush=True, waits (without blocking the loop) until it was written.
+    """
+    msg = sep.join(str(value) for value in values)
+    _ensure_printer()
+    _defer(safe_print, msg)
+    if flush:
+        await drain_output()
+
+async def drain_output():
+    """Waits (without blocking the loop) until the output queued on the event loop thread so far was written."""
+    if _LOOP_PRINTER is None:
+        return
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def _notify():
+        loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+    _LOOP_OUTPUT.put((_notify, (), (False, None, None)))
+    await done
+
+def set_stdout_writer(writer):
+    """Routes all console output through a StdoutWriter. Pass None to write to sys.stdout directly again."""
+    global _WRITER
+    previous = _WRITER
+    try:
+        sys.stdout.flush()
+    except BlockingIOError:
+        # A full pipe while a non-blocking writer owns the descriptor; that output is lost either way.
+        pass
+    if writer is not None:
+        # Closed by _flush_at_exit instead, after the JSONL writer was flushed into it.
+        atexit.unregister(writer.close)
+    _WRITER = writer
+    if previous is not None and previous is not writer:
+        previous.close()
+
+def get_stdout_writer():
+    return _WRITER
+
+def set_recorder(recorder):
+    """Sets the session recorder that receives every safe_print message and command timing. Pass None to disable."""
+    global _RECORDER
+    _RECORDER = recorder
+
+def get_recorder():
+    return _RECORDER
+
+def set_log_throttle(throttle: "LogThrottle | None"):
+    """Sets the LogThrottle used by every CLILoggingHandler that has no throttle of its own. Pass None to disable."""
+    global _THROTTLE
+    if _THROTTLE is not None and _THROTTLE is not throttle:
+        _THROTTLE.flush()
+    _THROTTLE = throttle
+
 class SafeLogger:
     """A dummy logger that uses safe_print to output logs to the console."""
     def __init__(self):
@@ -46,13 +186,264 @@ class SafeLogger:
     def getEffectiveLevel(self):
         return 0
 
+def _finite(value: Any) -> Any:
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+class JsonlWriter:
+    """
+    Writes one compact JSON object per line with the fields
+    ts, level, logger, command and msg (plus any static fields).
+    Static fields are encoded once, and lines are buffered and written
+    in batches when the buffer fills up or after flush_interval seconds.
+    """
+    def __init__(self, stream=None, *, static_fields: dict | None = None, buffer_size: int = 8192, flush_interval: float = 0.2):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str, allow_nan=False)
+        self._prefix = "{" + "".join(f"{encode_basestring(str(k))}:{self._encode(v)}," for k, v in (static_fields or {}).items())
+        self._names: dict[str | None, str] = {None: "null"}
+        self._lock = threading.Lock()
+        self._pending: list[str] = []
+        self._pending_size = 0
+        self._timer: threading.Timer | None = None
+
+    def _encode(self, value: Any) -> str:
+        try:
+            return self._encoder.encode(value)
+        except ValueError:
+            # NaN and infinity are not valid JSON; they are written as strings like other unsupported values.
+            return self._encoder.encode(_finite(value))
+
+    def _name(self, value: str | None) -> str:
+        # Levels and logger names repeat constantly, so their encoded form is cached.
+        encoded = self._names.get(value)
+        if encoded is None:
+            encoded = self._names[value] = encode_basestring(value)
+        return encoded
+
+    def write_record(self, msg: str, *, level: str | None = "INFO", logger: str | None = None, command: str | None = None, ts: float | None = None):
+        """Serializes a single console record."""
+        self._append(f'{self._prefix}"ts":{time.time() if ts is None else ts:.6f},"level":{self._name(level)},"logger":{self._name(logger)},"command":{self._name(command)},"msg":{encode_basestring(msg)}}}\n')
+
+    def write_result(self, command: str, result: Any, *, ts: float | None = None):
+        """Serializes the return value of a command."""
+        self._append(f'{self._prefix}"ts":{time.time() if ts is None else ts:.6f},"level":"RESULT","logger":null,"command":{self._name(command)},"result":{self._encode(result)}}}\n')
+
+    def _append(self, line: str):
+        with self._lock:
+            self._pending.append(line)
+            self._pending_size += len(line)
+            if self._pending_size >= self.buffer_size or self.flush_interval <= 0:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Writes every buffered line to the stream."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        data = "".join(self._pending)
+        self._pending.clear()
+        self._pending_size = 0
+        try:
+            if self.stream is None:
+                write_text(data)
+            else:
+                self.stream.write(data)
+                self.stream.flush()
+        except Exception:
+            pass
+
+def set_output_mode(mode: str = "text", *, stream=None, static_fields: dict | None = None, buffer_size: int = 8192, flush_interval: float = 0.2) -> "JsonlWriter | None":
+    """
+    Selects how safe_print, CLILoggingHandler and command results are written.
+    "text" keeps the interactive output, "jsonl" writes one JSON object per line
+    and "auto" uses jsonl only when stdout is not a TTY.
+    """
+    global _JSONL
+    if mode not in ("text", "jsonl", "auto"):
+        raise ValueError(f"Unknown output mode '{mode}'. Expected 'text', 'jsonl' or 'auto'.")
+
+    if _JSONL is not None:
+        _JSONL.flush()
+        _JSONL = None
+
+    if mode == "jsonl" or (mode == "auto" and not (stream or sys.stdout).isatty()):
+        _JSONL = JsonlWriter(stream, static_fields=static_fields, buffer_size=buffer_size, flush_interval=flush_interval)
+    return _JSONL
+
+def _flush_at_exit():
+    # A single hook for whichever writers are current, so replaced writers are not kept alive until exit.
+    if _JSONL is not None:
+        _JSONL.flush()
+    if _WRITER is not None:
+        _WRITER.close()
+
+atexit.register(_flush_at_exit)
+
+def emit_result(command: str, result: Any):
+    """Writes a command's return value in jsonl mode. Does nothing in text mode."""
+    if _JSONL is not None and result is not None:
+        _JSONL.write_result(command, result)
+
+def _current_command() -> str | None:
+    snapshot = getattr(_PRINTER_STATE, "snapshot", None)
+    if snapshot is not None:
+        return snapshot[1]
+    return running_command.get()
+
+class LogThrottle:
+    """
+    Collapses identical consecutive log records into a single
+    "last message repeated N times" line and applies a per-logger
+    token-bucket rate limit. Summaries of suppressed records are
+    flushed on a timer so they show up even if the logger goes quiet.
+    """
+    def __init__(self, rate: float = 20.0, burst: int = 50, flush_interval: float = 5.0, dedupe: bool = True):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.flush_interval = flush_interval
+        self.dedupe = dedupe
+        self._lock = threading.Lock()
+        self._buckets: dict[str, list[float]] = {}
+        self._suppressed: dict[str, int] = {}
+        self._last_key = None
+        self._repeats = 0
+        self._timer: threading.Timer | None = None
+
+    def allow(self, record: logging.LogRecord) -> bool:
+        """Returns True if the record should be printed, False if it was collapsed or rate limited."""
+        pending = None
+        key = None
+        with self._lock:
+            if self.dedupe:
+                key = (record.name, record.levelno, record.getMessage())
+                if key == self._last_key:
+                    self._repeats += 1
+                    self._schedule_flush()
+                    return False
+
+            now = time.monotonic()
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now]
+            else:
+                bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1.0:
+                self._suppressed[record.name] = self._suppressed.get(record.name, 0) + 1
+                self._schedule_flush()
+                allowed = False
+            else:
+                bucket[0] -= 1.0
+                allowed = True
+                # Only printed records can be repeated, otherwise the summary would name the wrong message.
+                if self.dedupe:
+                    if self._repeats:
+                        pending = self._repeat_summary()
+                    self._last_key = key
+
+        if pending:
+            safe_print(pending)
+        return allowed
+
+    def flush(self):
+        """Prints the summaries of every collapsed or rate limited record right away."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            lines = []
+            if self._repeats:
+                lines.append(self._repeat_summary())
+            for name, count in self._suppressed.items():
+                lines.append(f"[{name}] {count} message(s) suppressed by rate limit")
+            self._suppressed.clear()
+        for line in lines:
+            safe_print(line)
+
+    def _repeat_summary(self) -> str:
+        # Must be called with self._lock held.
+        summary = f"last message repeated {self._repeats} time{'s' if self._repeats != 1 else ''}"
+        self._repeats = 0
+        return summary
+
+    def _schedule_flush(self):
+        # Must be called with self._lock held.
+        if self._timer is None and self.flush_interval > 0:
+            self._timer = threading.Timer(self.flush_interval, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
 class CLILoggingHandler(logging.Handler):
     """
     A logging handler that uses safe_print to output logs to the console,
     preserving the current input line.
     """
+    def __init__(self, level=logging.NOTSET, *, throttle: LogThrottle | None = None):
+        super().__init__(level)
+        self.throttle = throttle
+
+    def handle(self, record):
+        if not _on_loop_thread():
+            return super().handle(record)
+
+        # On the event loop thread: no handler lock, no print_lock. The message is
+        # rendered now (its arguments may change later) and emitted by the printer thread.
+        rv = self.filter(record)
+        if rv:
+            try:
+                record = copy.copy(record)
+                record.msg = record.getMessage()
+                record.args = None
+            except Exception:
+                self.handleError(record)
+                return rv
+            _defer(self._emit_locked, record)
+        return rv
+
+    def _emit_locked(self, record):
+        self.acquire()
+        try:
+            self.emit(record)
+        finally:
+            self.release()
+
     def emit(self, record):
         try:
+            throttle = self.throttle if self.throttle is not None else _THROTTLE
+            if throttle is not None and not throttle.allow(record):
+                return
+            if _JSONL is not None:
+                msg = record.getMessage()
+                if record.exc_info:
+                    msg = f"{msg}\n{(self.formatter or logging.Formatter()).formatException(record.exc_info)}"
+                _JSONL.write_record(msg, level=record.levelname, logger=record.name, command=_current_command(), ts=record.created)
+                return
             msg = self.format(record)
             safe_print(msg)
         except Exception:
@@ -97,6 +488,21 @@ def safe_print(msg: object, cursor: str | None = None, input_buffer: str | None
     except:
         msg = "<Unprintable Object>"
 
+    if _on_loop_thread():
+        _defer(safe_print, msg, cursor, input_buffer)
+        return
+
+    scrollback = getattr(_HANDLER, "scrollback", None) if _HANDLER is not None else None
+    if scrollback is not None:
+        scrollback.write(msg)
+
+    if _RECORDER is not None:
+        _RECORDER.record_output(msg)
+
+    if _JSONL is not None:
+        _JSONL.write_record(msg, command=_current_command())
+        return
+
     if cursor is None and input_buffer is None and _HANDLER is not None:
         lock: threading.Lock | None = None
         try:
@@ -106,7 +512,8 @@ def safe_print(msg: object, cursor: str | None = None, input_buffer: str | None
             
             cursor = str(getattr(_HANDLER, "cursor", ""))
             input_buffer = str(getattr(_HANDLER, "input_buffer", ""))
-            processing_command = getattr(_HANDLER, "processing_command", False)
+            snapshot = getattr(_PRINTER_STATE, "snapshot", None)
+            processing_command = snapshot[0] if snapshot is not None else getattr(_HANDLER, "processing_command", False)
             
             if processing_command:
                 cursor = ""
@@ -119,6 +526,33 @@ def safe_print(msg: object, cursor: str | None = None, input_buffer: str | None
     else:
         _do_safe_print(msg, str(cursor or ""), str(input_buffer or ""))
 
+def terminal_output() -> bool:
+    """Whether the prompt and the line editor echo may be written, i.e. stdout is not carrying the JSONL stream."""
+    return _JSONL is None or (_JSONL.stream is not None and _JSONL.stream is not sys.stdout)
+
+def write_text(text: str):
+    """Writes text to stdout (or the active StdoutWriter) and flushes it."""
+    if _WRITER is not None:
+        _WRITER.write(text.encode(getattr(sys.stdout, "encoding", None) or "utf-8", "replace"))
+        return
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+def write_bytes(data: bytes):
+    """Writes already encoded output (e.g. from the LineEditor) to stdout (or the active StdoutWriter) and flushes it."""
+    if _WRITER is not None:
+        _WRITER.write(data)
+        return
+    stream = sys.stdout
+    buffer = getattr(stream, "buffer", None)
+    if buffer is None:
+        stream.write(data.decode(getattr(stream, "encoding", None) or "utf-8", "replace"))
+        stream.flush()
+        return
+    stream.flush()
+    buffer.write(data)
+    buffer.flush()
+
 def _do_safe_print(msg: str, cursor: str, input_buffer: str):
     is_ptero = os.environ.get('P_SERVER_UUID') or os.environ.get('CLI_IH_FORCE_FALLBACK')
     handler_in_fallback_mode = False
@@ -129,8 +563,7 @@ def _do_safe_print(msg: str, cursor: str, input_buffer: str):
             handler_in_fallback_mode = True
 
     if is_ptero or not sys.stdout.isatty() or handler_in_fallback_mode:
-        sys.stdout.write(f"{msg}\n")
-        sys.stdout.flush()
+        write_text(f"{msg}\n")
         return
 
     try:
@@ -138,7 +571,4 @@ def _do_safe_print(msg: str, cursor: str, input_buffer: str):
     except:
         columns = 80
             
-    sys.stdout.write('\r' + ' ' * (columns - 1) + '\r')
-    sys.stdout.write(f"{msg}\n")
-    sys.stdout.write(f"{cursor}{input_buffer}")
-    sys.stdout.flush()
\ No newline at end of file
+    write_text('\r' + ' ' * (columns - 1) + '\r' + f"{msg}\n" + f"{cursor}{input_buffer}")
\ No newline at end of file
@@ -0,0 +1,94 @@
+import random
+import pytest
+from cli_ih import InputHandler
+from cli_ih.command_tree import CommandTree
+
+def make_tree(*names: str) -> CommandTree:
+    tree = CommandTree()
+    for name in names:
+        tree.insert(tuple(name.split())).command = {"description": name}
+    return tree
+
+def edges(node) -> dict:
+    return {label: child.name for label, child in node.children.values()}
+
+def test_single_chain_is_one_edge():
+    tree = make_tree("db export users")
+    assert edges(tree.root) == {("db", "export", "users"): "db export users"}
+
+def test_insert_splits_edges():
+    tree = make_tree("db export users", "db export groups", "db import")
+    assert edges(tree.root) == {("db",): "db"}
+    db = tree.root.children["db"][1]
+    assert edges(db) == {("export",): "db export", ("import",): "db import"}
+    export = db.children["export"][1]
+    assert edges(export) == {("users",): "db export users", ("groups",): "db export groups"}
+    assert db.command is None and export.command is None
+
+def test_insert_returns_existing_inner_node():
+    tree = make_tree("db export users")
+    node = tree.insert(("db", "export"))
+    assert node.name == "db export"
+    assert tree.insert(("db", "export")) is node
+    assert tree.insert(("db", "export", "users")).command == {"description": "db export users"}
+
+def test_resolve_longest_match_and_arguments():
+    tree = make_tree("db", "db export", "db export users")
+    match, consumed, _ = tree.resolve(["DB", "export", "users", "--csv"])
+    assert (match.name, consumed) == ("db export users", 3)
+    match, consumed, _ = tree.resolve(["db", "export", "groups"])
+    assert (match.name, consumed) == ("db export", 2)
+    match, consumed, _ = tree.resolve(["db", "status"])
+    assert (match.name, consumed) == ("db", 1)
+
+def test_resolve_does_not_match_inside_a_compressed_edge():
+    tree = make_tree("db export users")
+    match, _, reached = tree.resolve(["db", "export", "groups"])
+    assert match is None
+    assert reached is tree.root
+
+def test_resolve_reports_partially_matched_group():
+    tree = make_tree("db export users", "db import")
+    match, _, reached = tree.resolve(["db"])
+    assert match is None and reached.name == "db"
+    # A partially typed compressed edge still reaches the node below it.
+    tree = make_tree("cache flush all")
+    match, _, reached = tree.resolve(["cache", "flush"])
+    assert match is None and reached.name == "cache flush all"
+
+def test_help_lines():
+    tree = make_tree("db export users", "db import", "help")
+    tree.insert(("db",)).description = "Database tools"
+    assert tree.help_lines(tree.root) == ["  db ...: Database tools", "  help: help"]
+    db = tree.insert(("db",))
+    assert tree.help_lines(db) == ["  db export users: db export users", "  db import: db import"]
+
+def test_iter_commands_in_registration_order():
+    tree = make_tree("b", "a x", "a y", "c")
+    assert [node.name for node in tree.iter_commands()] == ["b", "a x", "a y", "c"]
+
+@pytest.mark.parametrize("seed", range(10))
+def test_resolve_matches_naive_lookup(seed):
+    rng = random.Random(seed)
+    words = ["a", "b", "c", "d"]
+    names = {" ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(15)}
+    tree = make_tree(*names)
+    for _ in range(200):
+        tokens = [rng.choice(words) for _ in range(rng.randint(0, 5))]
+        expected = max((n for n in names if tokens[:len(n.split())] == n.split()), key=lambda n: len(n.split()), default=None)
+        match, consumed, _ = tree.resolve(tokens)
+        assert (match.name if match else None) == expected
+        assert consumed == (len(expected.split()) if expected else 0)
+
+def test_handler_prints_group_help_for_partial_path(capsys):
+    handler = InputHandler(thread_mode=False, register_defaults=False)
+    db = handler.group("db", "Database tools")
+
+    @db.command(name="export users", description="Exports users")
+    def export_users():
+        pass
+
+    handler._execute("db")
+    assert capsys.readouterr().out.splitlines() == ["Commands in 'db':", "  db export users: Exports users"]
+    handler._execute("db export")
+    assert capsys.readouterr().out.splitlines()[0] == "Commands in 'db export':"
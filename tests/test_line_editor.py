@@ -0,0 +1,124 @@
+import pytest
+from cli_ih.line_editor import LineEditor, OUTPUT, SUBMIT, INTERRUPT
+
+def submitted(actions) -> list:
+    return [value for action, value in actions if action == SUBMIT]
+
+def echoed(actions) -> bytes:
+    return b"".join(value for action, value in actions if action == OUTPUT)
+
+def with_history(*lines: str) -> LineEditor:
+    editor = LineEditor("> ", columns=10)
+    for line in lines:
+        editor.add_history(line)
+    return editor
+
+def test_typing_and_enter():
+    editor = LineEditor("> ")
+    actions = editor.feed(b"help\r")
+    assert actions == [(OUTPUT, b"help\n"), (SUBMIT, "help")]
+    assert editor.buffer == ""
+    assert editor.history == ["help"]
+
+def test_single_key_fast_path():
+    editor = LineEditor("> ")
+    assert editor.feed(b"h") == [(OUTPUT, b"h")]
+    assert editor.feed_keys("i") == [(OUTPUT, b"i")]
+    assert editor.buffer == "hi"
+
+def test_utf8_split_across_feeds():
+    editor = LineEditor("> ")
+    data = "héllo €".encode()
+    actions = []
+    for i in range(len(data)):
+        actions += editor.feed(data[i:i + 1])
+    assert editor.buffer == "héllo €"
+    assert echoed(actions) == data
+
+@pytest.mark.parametrize("up, down", [(b"\x1b[A", b"\x1b[B"), (b"\x1bOA", b"\x1bOB"), (b"\x1b[1;5A", b"\x1b[1;5B")])
+def test_arrow_keys_walk_the_history(up, down):
+    editor = with_history("first", "second")
+    editor.feed(up)
+    assert editor.buffer == "second"
+    editor.feed(up + up)
+    assert editor.buffer == "first"
+    editor.feed(down)
+    assert editor.buffer == "second"
+    editor.feed(down)
+    assert editor.buffer == ""
+
+def test_arrow_sequence_split_across_feeds():
+    editor = with_history("first")
+    assert editor.feed(b"\x1b") == []
+    assert editor.feed(b"[") == []
+    actions = editor.feed(b"A")
+    assert editor.buffer == "first"
+    assert echoed(actions) == b"\r" + b" " * 9 + b"\r> first"
+
+def test_unknown_sequences_are_ignored():
+    editor = LineEditor("> ")
+    actions = editor.feed(b"a\x1b[3~b\x1b[Cc")
+    assert editor.buffer == "abc"
+    assert echoed(actions) == b"abc"
+
+@pytest.mark.parametrize("newline", [b"\r\n", b"\r", b"\n"])
+def test_line_endings_submit_once(newline):
+    editor = LineEditor("> ")
+    actions = editor.feed(b"a" + newline + b"b" + newline)
+    assert submitted(actions) == ["a", "b"]
+
+def test_crlf_split_across_feeds_submits_once():
+    editor = LineEditor("> ")
+    assert submitted(editor.feed(b"a\r")) == ["a"]
+    assert submitted(editor.feed(b"\n")) == []
+    # A second newline on its own is an empty line again.
+    assert submitted(editor.feed(b"\n")) == [""]
+
+def test_backspace():
+    editor = LineEditor("> ")
+    actions = editor.feed(b"ab\x7f\x08c")
+    assert editor.buffer == "c"
+    assert echoed(actions) == b"ab\b \b\b \bc"
+
+def test_backspace_on_empty_buffer_does_nothing():
+    editor = LineEditor("> ")
+    assert editor.feed(b"\x7f\x08") == []
+    assert editor.buffer == ""
+
+def test_ctrl_c_drops_the_rest_of_the_input():
+    editor = LineEditor("> ")
+    actions = editor.feed(b"one\rtw\x03three\r")
+    assert actions == [(OUTPUT, b"one\n"), (SUBMIT, "one"), (OUTPUT, b"tw"), (INTERRUPT, None)]
+    assert editor.buffer == "tw"
+
+def test_feed_keys_scancodes():
+    editor = with_history("first", "second")
+    editor.feed_keys("\xe0H")
+    assert editor.buffer == "second"
+    editor.feed_keys("\x00H")
+    assert editor.buffer == "first"
+    editor.feed_keys("\xe0P\xe0P")
+    assert editor.buffer == ""
+    # Other scancodes (e.g. left arrow) are dropped with their prefix.
+    editor.feed_keys("\xe0Kx")
+    assert editor.buffer == "x"
+
+def test_feed_keys_does_not_treat_escape_as_a_sequence():
+    editor = LineEditor("> ")
+    editor.feed_keys("\x1b[A")
+    assert editor.buffer == "[A"
+
+def test_history_skips_repeats_and_empty_lines():
+    editor = LineEditor("> ")
+    editor.feed(b"a\ra\r\rb\r")
+    assert editor.history == ["a", "b"]
+    assert editor.history_index == 2
+
+def test_no_echo():
+    editor = LineEditor("> ", echo=False)
+    assert editor.feed(b"secret\r") == [(SUBMIT, "secret")]
+
+def test_non_printable_characters_are_dropped():
+    editor = LineEditor("> ")
+    editor.feed("a\u200bb".encode())
+    assert editor.buffer == "ab"
@@ -0,0 +1,70 @@
+import os
+import pytest
+from cli_ih.output import StdoutWriter
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    yield read_fd, write_fd
+    for fd in (read_fd, write_fd):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def read_all(fd: int) -> bytes:
+    os.set_blocking(fd, False)
+    chunks = []
+    while True:
+        try:
+            chunk = os.read(fd, 65536)
+        except BlockingIOError:
+            break
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def test_writes_through_and_stays_blocking_by_default(pipe):
+    read_fd, write_fd = pipe
+    writer = StdoutWriter(write_fd)
+    assert os.get_blocking(write_fd)
+    writer.write(b"hello ")
+    writer.write(b"world")
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert read_all(read_fd) == b"hello world"
+    assert writer.stats()["bytes_written"] == 11
+
+def test_nonblocking_is_opt_in_and_restored(pipe):
+    _, write_fd = pipe
+    writer = StdoutWriter(write_fd, nonblocking=True)
+    assert not os.get_blocking(write_fd)
+    writer.close()
+    assert os.get_blocking(write_fd)
+
+def test_drop_policy_never_waits_for_a_stalled_consumer(pipe):
+    _, write_fd = pipe
+    writer = StdoutWriter(write_fd, max_buffer=1024, policy="drop", nonblocking=True)
+    accepted = sum(writer.write(b"x" * 100) for _ in range(5000))
+    stats = writer.stats()
+    assert accepted + stats["bytes_dropped"] == 500_000
+    assert stats["bytes_dropped"] > 0
+    writer.close(timeout=0.1)
+
+def test_truncate_policy_marks_dropped_output(pipe):
+    read_fd, write_fd = pipe
+    writer = StdoutWriter(write_fd, max_buffer=100, policy="truncate", nonblocking=True)
+    # Fill the pipe until the writer thread stalls and its buffer overflows.
+    while writer.stats()["bytes_dropped"] == 0:
+        writer.write(b"y" * 60)
+    read_all(read_fd)
+    os.set_blocking(read_fd, True)
+    assert writer.flush(timeout=5)
+    writer.write(b"after")
+    writer.close()
+    assert b"bytes dropped ...]\nafter" in read_all(read_fd)
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        StdoutWriter(1, policy="wait")
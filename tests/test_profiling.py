@@ -0,0 +1,27 @@
+import pytest
+from cli_ih.profiling import MemoryProfile, parse_options, PROFILE_USAGE
+
+def build_temporaries():
+    chunks = [bytes(1024 * 1024) for _ in range(20)]
+    total = sum(len(chunk) for chunk in chunks)
+    del chunks
+    return total
+
+def test_memory_profile_shows_temporary_allocations():
+    kept = []
+    with MemoryProfile() as mem:
+        build_temporaries()
+        kept.append(bytearray(256 * 1024))
+    assert mem.peak >= 20 * 1024 * 1024
+    report = mem.format("build", 3)
+    at_peak, retained = report.split("still held after the command:")
+    top_at_peak = at_peak.splitlines()[2]
+    assert "test_profiling.py" in top_at_peak and "MiB" in top_at_peak
+    assert "test_profiling.py" in retained.splitlines()[1]
+
+def test_parse_options():
+    assert parse_options(("-n", "5", "-s", "tottime", "db", "export"), PROFILE_USAGE) == (5, "tottime", None, "db export")
+    with pytest.raises(ValueError):
+        parse_options(("-s", "nope", "cmd"), PROFILE_USAGE)
+    with pytest.raises(ValueError):
+        parse_options(("-n", "3"), PROFILE_USAGE)
@@ -0,0 +1,74 @@
+import time
+from cli_ih import InputHandler
+from cli_ih.recorder import SessionRecorder, replay, read_trace, EVENT_COMMAND, EVENT_SCHEDULED
+
+def make_handler(runs: list) -> InputHandler:
+    handler = InputHandler(thread_mode=False, register_defaults=True)
+    db = handler.group("db")
+
+    @db.command(name="export")
+    def export(*args):
+        runs.append(("export",) + args)
+
+    @db.command(name="import")
+    def import_(*args):
+        runs.append(("import",) + args)
+
+    @handler.command(name="stats")
+    def stats():
+        runs.append(("stats",))
+
+    return handler
+
+def test_summary_groups_by_resolved_command(tmp_path):
+    runs = []
+    handler = make_handler(runs)
+    path = tmp_path / "session.trace"
+    with SessionRecorder(path):
+        handler._execute("db export users")
+        handler._execute("db export groups")
+        handler._execute("db import users")
+
+    report = replay(path, handler, speed=None)
+    assert runs[3:] == [("export", "users"), ("export", "groups"), ("import", "users")]
+    summary = report.summary()
+    assert "db export: 2 run(s)" in summary
+    assert "db import: 1 run(s)" in summary
+
+def test_scheduled_runs_replay_once_and_exit_stops(tmp_path):
+    runs = []
+    handler = make_handler(runs)
+    path = tmp_path / "session.trace"
+    with SessionRecorder(path):
+        handler._execute("every 50ms stats")
+        time.sleep(0.18)
+        handler.scheduler.cancel_all()
+        try:
+            handler._execute("exit")
+        except Exception:
+            pass
+        handler._execute("stats")
+
+    kinds = [event.kind for event in read_trace(path) if event.kind in (EVENT_COMMAND, EVENT_SCHEDULED)]
+    scheduled = kinds.count(EVENT_SCHEDULED)
+    assert scheduled >= 2
+
+    runs.clear()
+    replay(path, handler, speed=None)
+    assert runs == [("stats",)] * scheduled
+    assert handler.scheduler.jobs() == []
+
+def test_recorded_keys_are_fed_through_the_editor(tmp_path):
+    runs = []
+    handler = make_handler(runs)
+    path = tmp_path / "session.trace"
+    recorder = SessionRecorder(path).install()
+    for key in "db expo\x08ort x\r":
+        recorder.record_input(key)
+    handler._execute("db export x")
+    recorder.close()
+
+    runs.clear()
+    report = replay(path, handler, speed=None)
+    assert runs == [("export", "x")]
+    assert [timing.name for timing in report.timings] == ["db export"]
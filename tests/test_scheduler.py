@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+import pytest
+from cli_ih import InputHandler
+from cli_ih.scheduler import ThreadScheduler, AsyncScheduler, parse_duration, format_duration
+from cli_ih.utils import running_command
+
+def test_parse_and_format_duration():
+    assert parse_duration("500ms") == 0.5
+    assert parse_duration("2m") == 120
+    assert parse_duration(3) == 3.0
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+    assert format_duration(0.25) == "250.0ms"
+    assert format_duration(90) == "90s"
+
+def test_wakeup_between_pop_and_wait_is_not_lost():
+    ran = threading.Event()
+
+    class RacingScheduler(ThreadScheduler):
+        raced = False
+
+        def _pop_due(self, now):
+            result = super()._pop_due(now)
+            if not self.raced:
+                # Schedule after the thread saw the 1h job as the next due, but before it waits.
+                self.raced = True
+                self.schedule("short", 0.05)
+            return result
+
+    scheduler = RacingScheduler(lambda job: ran.set() if job.command == "short" else None)
+    try:
+        scheduler.schedule("long", 3600)
+        assert ran.wait(1.0)
+    finally:
+        scheduler.stop()
+
+def test_catch_up_counts_skipped_runs():
+    scheduler = ThreadScheduler(lambda job: time.sleep(0.25))
+    try:
+        job = scheduler.schedule("slow", 0, 0.1)
+        time.sleep(0.6)
+    finally:
+        scheduler.stop()
+    # Each 250ms run covers three 100ms intervals: one run, two skipped.
+    assert job.runs >= 2
+    assert job.skipped >= job.runs
+    assert "skipped" in job.describe()
+
+def test_async_scheduler_counts_only_started_runs():
+    started = []
+
+    async def execute(job):
+        started.append(time.monotonic())
+        await asyncio.sleep(0.35)
+
+    async def main():
+        scheduler = AsyncScheduler(execute)
+        task = asyncio.create_task(scheduler.run())
+        job = scheduler.schedule("slow", 0, 0.1)
+        await asyncio.sleep(1.0)
+        task.cancel()
+        return job
+
+    job = asyncio.run(main())
+    assert job.runs == len(started)
+    assert job.skipped >= 5
+
+def test_running_command_is_per_thread():
+    handler = InputHandler(thread_mode=False, register_defaults=False)
+    seen = {}
+    barrier = threading.Barrier(2)
+
+    @handler.command(name="probe")
+    def probe(label):
+        barrier.wait()
+        seen[label] = handler.current_command
+        barrier.wait()
+
+    @handler.command(name="other probe")
+    def other_probe(label):
+        barrier.wait()
+        seen[label] = handler.current_command
+        barrier.wait()
+
+    thread = threading.Thread(target=handler._execute, args=("other probe b",))
+    thread.start()
+    handler._execute("probe a")
+    thread.join()
+    assert seen == {"a": "probe", "b": "other probe"}
+    assert running_command.get() is None
@@ -0,0 +1,84 @@
+import random
+import threading
+import pytest
+from cli_ih.scrollback import ScrollbackBuffer
+
+def test_lines_and_negative_indexes():
+    buffer = ScrollbackBuffer(64)
+    buffer.write("one\ntwo")
+    buffer.write("three")
+    assert len(buffer) == 3
+    assert buffer.lines() == ["one", "two", "three"]
+    assert buffer.lines(-2) == ["two", "three"]
+    assert buffer.lines(0, 1) == ["one"]
+
+def test_wraparound_evicts_overwritten_lines():
+    buffer = ScrollbackBuffer(16)
+    for line in ["aaaa", "bbbb", "cccc"]:
+        buffer.write(line)
+    # 12 of 16 bytes are used, so "dddd" fits and "eeee" wraps to the start, overwriting "aaaa".
+    buffer.write("dddd")
+    buffer.write("eeee")
+    assert buffer.lines() == ["bbbb", "cccc", "dddd", "eeee"]
+
+def test_line_is_not_split_across_the_end():
+    buffer = ScrollbackBuffer(10)
+    buffer.write("1234567")
+    # Only 3 bytes are left at the end, so "abcde" goes to the start and evicts "1234567".
+    buffer.write("abcde")
+    assert buffer.lines() == ["abcde"]
+    buffer.write("xy")
+    assert buffer.lines() == ["abcde", "xy"]
+
+def test_max_lines_eviction():
+    buffer = ScrollbackBuffer(1024, max_lines=3)
+    for i in range(5):
+        buffer.write(f"line {i}")
+    assert len(buffer) == 3
+    assert buffer.lines() == ["line 2", "line 3", "line 4"]
+
+def test_line_longer_than_capacity_keeps_its_end():
+    buffer = ScrollbackBuffer(8)
+    buffer.write("short")
+    buffer.write("0123456789abcdef")
+    assert buffer.lines() == ["89abcdef"]
+
+def test_search_returns_line_numbers():
+    buffer = ScrollbackBuffer(256)
+    buffer.write("GET /a 200\nGET /b 500\nPOST /c 500")
+    assert buffer.search(r"\b500$") == [(2, "GET /b 500"), (3, "POST /c 500")]
+    assert buffer.search("post", ignore_case=True) == [(3, "POST /c 500")]
+
+def test_paused_only_affects_the_current_thread():
+    buffer = ScrollbackBuffer(256)
+    with buffer.paused():
+        buffer.write("hidden")
+        thread = threading.Thread(target=buffer.write, args=("other thread",))
+        thread.start()
+        thread.join()
+    buffer.write("shown")
+    assert buffer.lines() == ["other thread", "shown"]
+
+def test_clear():
+    buffer = ScrollbackBuffer(16)
+    buffer.write("abc\ndef")
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.write("ghi")
+    assert buffer.lines() == ["ghi"]
+
+@pytest.mark.parametrize("seed", range(20))
+def test_always_keeps_a_suffix_of_the_written_lines(seed):
+    rng = random.Random(seed)
+    capacity, max_lines = rng.randint(8, 64), rng.randint(1, 12)
+    buffer = ScrollbackBuffer(capacity, max_lines)
+    written = []
+    for _ in range(300):
+        line = "".join(rng.choice("abcxyz") for _ in range(rng.randint(0, capacity + 4)))
+        buffer.write(line)
+        written.append(line[-capacity:])
+
+        lines = buffer.lines()
+        assert 1 <= len(lines) <= max_lines
+        assert lines == written[len(written) - len(lines):]
+        assert sum(len(stored) for stored in lines) <= capacity